@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import argparse
+import io
+import time
+
+import library.files
+from library.photo.exif_reader import CountingReader, ExifReaderError, read_tags
+from library.photo.photo_file import get_exif, get_pillow_exif
+
+import logging
+log = logging.getLogger('benchmark')
+
+EXTENSIONS = {'jpg', 'jpeg', 'tif', 'tiff', 'dng'}
+
+
+def pillow_bytes(filename: str) -> int:
+    with open(filename, 'rb', buffering=0) as raw:
+        reader = CountingReader(raw)
+        get_pillow_exif(io.BufferedReader(reader))
+    return reader.bytes_read
+
+
+def header_bytes(filename: str) -> int:
+    with open(filename, 'rb', buffering=0) as raw:
+        reader = CountingReader(raw)
+        try:
+            read_tags(reader, filename)
+        except ExifReaderError:
+            return reader.bytes_read + pillow_bytes(filename)
+    return reader.bytes_read
+
+
+def measure(name: str, filenames: list, get_func, bytes_func):
+    start = time.perf_counter()
+    results = [get_func(filename) for filename in filenames]
+    duration = time.perf_counter() - start
+
+    read_bytes = sum(bytes_func(filename) for filename in filenames)
+    count = max(len(filenames), 1)
+    log.info(
+        f'{name:>6}: {duration:.3f} s, {1000 * duration / count:.3f} ms/file, '
+        f'{read_bytes} bytes read, {read_bytes / count:.0f} bytes/file'
+    )
+    return results
+
+
+def run(args):
+    filenames = sorted(
+        filename
+        for dirname in args.dir
+        for filename in library.files.walk(dirname)
+        if filename.split('.')[-1].lower() in EXTENSIONS
+    )[:args.limit]
+    log.info(f'Benchmarking {len(filenames)} files')
+
+    pillow_results = measure('pillow', filenames, get_pillow_exif, pillow_bytes)
+    header_results = measure('header', filenames, get_exif, header_bytes)
+
+    mismatches = [
+        filename
+        for filename, pillow_result, header_result in zip(filenames, pillow_results, header_results)
+        if pillow_result != header_result
+    ]
+    log.info(f'Mismatched results: {len(mismatches)}')
+    for filename in mismatches[:10]:
+        log.info(f'\t{filename}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('EXIF reader benchmark')
+    parser.add_argument('--dir', help='Dir with photos', action='append', required=True)
+    parser.add_argument('--limit', help='Max files count', type=int, default=1000)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-7s %(message)s')
+    run(parser.parse_args())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+import argparse
+import math
+import time
+
+import numpy
+import geopy.distance
+
+from tools.running import geodesic
+from tools.running.fitreader import read_fit_file
+from tools.running.segment import Segment
+from tools.running.track import Track
+from tools.running.track_columns import TrackColumns
+
+import logging
+log = logging.getLogger('benchmark')
+
+
+def random_segments(count: int, max_km: float, seed: int):
+    rng = numpy.random.default_rng(seed)
+    lat1 = rng.uniform(-70, 70, count)
+    lon1 = rng.uniform(-180, 180, count)
+    distance = max_km * rng.random(count)
+    bearing = rng.uniform(0, 2 * math.pi, count)
+    lat2 = numpy.clip(lat1 + numpy.degrees(distance * numpy.cos(bearing) / 6371), -89, 89)
+    lon2 = lon1 + numpy.degrees(distance * numpy.sin(bearing) / 6371 / numpy.cos(numpy.radians(lat1)))
+    return lat1, lon1, lat2, lon2
+
+
+def run_errors(args):
+    for max_km in [0.01, 1, 10, 1000]:
+        lat1, lon1, lat2, lon2 = random_segments(args.segments, max_km, args.seed)
+        expected = numpy.array([
+            geopy.distance.distance((a, b), (c, d)).km
+            for a, b, c, d in zip(lat1, lon1, lat2, lon2)
+        ])
+        for mode in geodesic.Mode:
+            start = time.perf_counter()
+            result = geodesic.pair_distances(lat1, lon1, lat2, lon2, mode=mode)
+            duration = time.perf_counter() - start
+            error = numpy.abs(result - expected)
+            relative = error[expected > 0] / expected[expected > 0]
+            log.info(
+                f'up to {max_km:7.2f} km, {mode.value:>9}: {len(result) / duration:10.0f} pairs/s, '
+                f'max error {error.max():.2e} km, max relative {relative.max():.2e}, mean relative {relative.mean():.2e}'
+            )
+
+
+def generate_track(points_count: int, seed: int) -> Track:
+    # 3 m/s walk around a random point, one point per second
+    rng = numpy.random.default_rng(seed)
+    lat0, lon0 = rng.uniform(-60, 60), rng.uniform(-180, 180)
+    heading = numpy.cumsum(rng.normal(0, 0.2, points_count))
+    step = 0.003 * rng.uniform(0.5, 1.5, points_count)
+    lat = lat0 + numpy.degrees(numpy.cumsum(step * numpy.cos(heading)) / 6371)
+    lon = lon0 + numpy.degrees(numpy.cumsum(step * numpy.sin(heading)) / 6371 / math.cos(math.radians(lat0)))
+    rows = [
+        (lon_value, lat_value, None, 1500000000 + index, None, None, None, None)
+        for index, (lat_value, lon_value) in enumerate(zip(lat.tolist(), lon.tolist()))
+    ]
+    return Track(filename=f'synthetic-{seed}.FIT', points=TrackColumns.from_rows(rows))
+
+
+def legacy_total_distance(track: Track) -> float:
+    points = track.ok_points
+    return sum(
+        segment.distance
+        for segment in [Segment(points[index], points[index + 1]) for index in range(len(points) - 1)]
+        if segment.duration < 10000
+    )
+
+
+def run_tracks(args):
+    if args.fit:
+        tracks = [read_fit_file(filename, raise_on_error=False) for filename in args.fit]
+    else:
+        tracks = [generate_track(args.points, seed) for seed in range(args.tracks)]
+
+    for track in tracks:
+        track.ok_points
+        start = time.perf_counter()
+        legacy = legacy_total_distance(track)
+        legacy_duration = time.perf_counter() - start
+
+        for mode in [geodesic.Mode.Exact, geodesic.Mode.Andoyer]:
+            start = time.perf_counter()
+            result = track.get_total_distance(mode)
+            duration = time.perf_counter() - start
+            log.info(
+                f'{track.basename}, {mode.value:>7}: {track.ok_count} points, {result:.4f} km vs {legacy:.4f} km, '
+                f'{legacy_duration * 1000:.1f} ms -> {duration * 1000:.2f} ms, speedup {legacy_duration / duration:.0f}x'
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Geodesic distances benchmark')
+    parser.add_argument('--segments', help='Random segments to check errors', type=int, default=20000)
+    parser.add_argument('--seed', help='Random seed', type=int, default=0)
+    parser.add_argument('--fit', help='FIT file to measure total_distance on', action='append', default=[])
+    parser.add_argument('--tracks', help='Synthetic tracks count if no FIT files given', type=int, default=3)
+    parser.add_argument('--points', help='Points in synthetic track', type=int, default=36000)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-7s %(message)s')
+    args = parser.parse_args()
+    run_errors(args)
+    run_tracks(args)
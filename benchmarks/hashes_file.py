@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from tools.photo.compare import Hashes
+from tools.photo.hashes_file import HashesFile
+
+import logging
+log = logging.getLogger('benchmark')
+
+
+def generate_hashes(count: int, files_per_dir: int, seed: int) -> Hashes:
+    rng = random.Random(seed)
+    hashes = Hashes(root='/photo')
+    for index in range(count):
+        dir_name = f'{2000 + index // files_per_dir // 1000}/dir_{index // files_per_dir:06d}'
+        hashes.tree.setdefault(dir_name, {})[f'IMG_{index % files_per_dir:04d}.JPG'] = rng.randbytes(16).hex()
+    return hashes
+
+
+def measure(name: str, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    log.info(f'{name}: {1000 * duration:.1f} ms, peak heap {peak / 2 ** 20:.1f} MB')
+    return result
+
+
+def run(args):
+    hashes = generate_hashes(args.count, args.files_per_dir, args.seed)
+    file_hashes = [file_hash for tree in hashes.tree.values() for file_hash in tree.values()]
+    queries = random.Random(args.seed).sample(file_hashes, min(args.lookups, len(file_hashes)))
+    log.info(f'Generated {len(file_hashes)} files in {len(hashes.tree)} dirs')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_file = os.path.join(tmp_dir, 'hashes.json')
+        binary_file = os.path.join(tmp_dir, 'hashes.bin')
+        hashes.save(json_file)
+        hashes.save_binary(binary_file)
+        log.info(f'Json: {os.path.getsize(json_file) / 2 ** 20:.1f} MB, binary: {os.path.getsize(binary_file) / 2 ** 20:.1f} MB')
+        del hashes
+
+        loaded = measure('json load', lambda: Hashes.load(json_file))
+        measure('json index', lambda: loaded.dirs_by_hash)
+        start = time.perf_counter()
+        expected = [loaded.dirs_by_hash[file_hash] for file_hash in queries]
+        log.info(f'json lookups: {len(queries) / (time.perf_counter() - start):.0f} lookups/s')
+        del loaded
+
+        hashes_file = measure('binary open', lambda: HashesFile(binary_file))
+        with hashes_file:
+            start = time.perf_counter()
+            result = [hashes_file.dirs_by_hash[file_hash] for file_hash in queries]
+            log.info(f'binary lookups: {len(queries) / (time.perf_counter() - start):.0f} lookups/s')
+            del hashes_file
+
+        log.info(f'Mismatches: {sum(1 for a, b in zip(result, expected) if a != b)}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Hashes file formats benchmark')
+    parser.add_argument('--count', help='Files count', type=int, default=2000000)
+    parser.add_argument('--files-per-dir', help='Files per dir', type=int, default=200)
+    parser.add_argument('--lookups', help='Lookups count', type=int, default=100000)
+    parser.add_argument('--seed', help='Random seed', type=int, default=0)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-7s %(message)s')
+    run(parser.parse_args())
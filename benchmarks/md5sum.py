@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import tempfile
+import time
+
+from library.md5sum import ALGORITHMS, file_digests, md5sum, md5sum_many
+
+import logging
+log = logging.getLogger('benchmark')
+
+BUFFER_SIZES = [2 ** 14, 2 ** 16, 2 ** 18, 2 ** 20, 2 ** 22]
+
+
+def create_file(dirname: str, size_mb: int, name: str = 'large.bin') -> str:
+    filename = os.path.join(dirname, name)
+    with open(filename, 'wb') as f:
+        for _ in range(size_mb):
+            f.write(os.urandom(2 ** 20))
+    return filename
+
+
+def measure(filenames: list, size: int, **kwargs) -> float:
+    start = time.perf_counter()
+    for filename in filenames:
+        file_digests(filename, **kwargs)
+    return size / 2 ** 20 / (time.perf_counter() - start)
+
+
+def run_files(filenames: list, args):
+    size = sum(os.path.getsize(filename) for filename in filenames)
+    log.info(f'Hashing {len(filenames)} files, {size / 2 ** 20:.0f} MB, best of {args.repeat} runs, MB/s:')
+    # first read warms page cache: numbers are for hashing, not for disk
+    measure(filenames, size)
+
+    log.info(f'{"buffer":>8}  ' + '  '.join(f'{name:>8}' for name in ALGORITHMS + ['all', 'separate']))
+    for buffer_size in BUFFER_SIZES:
+        speeds = [
+            max(measure(filenames, size, algorithms=[algorithm], buffer_size=buffer_size) for _ in range(args.repeat))
+            for algorithm in ALGORITHMS
+        ]
+        speeds.append(max(
+            measure(filenames, size, algorithms=ALGORITHMS, partial=True, buffer_size=buffer_size)
+            for _ in range(args.repeat)
+        ))
+        # separate reads per digest, as before
+        speeds.append(1 / sum(1 / speed for speed in speeds[:len(ALGORITHMS)]))
+        log.info(f'{buffer_size // 1024:>7}K  ' + '  '.join(f'{speed:8.0f}' for speed in speeds))
+
+
+def run_many(filenames: list, args):
+    size = sum(os.path.getsize(filename) for filename in filenames)
+    for filename in filenames:
+        md5sum(filename)
+
+    start = time.perf_counter()
+    expected = [md5sum(filename) for filename in filenames]
+    log.info(f'md5sum one by one: {size / 2 ** 20 / (time.perf_counter() - start):.0f} MB/s')
+
+    for workers in [1, 2, 4, 8]:
+        start = time.perf_counter()
+        result = [digest for _, digest in md5sum_many(filenames, workers=workers)]
+        log.info(f'md5sum_many, {workers} workers: {size / 2 ** 20 / (time.perf_counter() - start):.0f} MB/s')
+        assert result == expected
+
+
+def run(args):
+    if args.many:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filenames = args.file or [create_file(tmp_dir, 8, f'{index}.bin') for index in range(args.size // 8)]
+            run_many(filenames, args)
+    elif args.file:
+        run_files(args.file, args)
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            run_files([create_file(tmp_dir, args.size)], args)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('File digests benchmark')
+    parser.add_argument('--file', help='Hash existing files instead of synthetic one', action='append', default=[])
+    parser.add_argument('--size', help='Synthetic file size, MB', type=int, default=512)
+    parser.add_argument('--repeat', help='Runs per measurement', type=int, default=3)
+    parser.add_argument('--many', help='Compare md5sum_many with one by one md5sum on 8 MB files', action='store_true')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-7s %(message)s')
+    run(parser.parse_args())
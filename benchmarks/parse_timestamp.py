@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import random
+import re
+import time
+
+from library.photo.parse_timestamp import parse_timestamps, MIN_OK_TIMESTAMP, MAX_OK_TIMESTAMP
+
+import logging
+log = logging.getLogger('benchmark')
+
+
+# previous implementation, uncompiled patterns and strptime per name
+LEGACY_TIMESTAMP_RE = r'(20\d{2}([-_\.:])?\d{2}([-_\.:])?\d{2}([-_\.: ])?\d{2}([-_\.:])?\d{2}([-_\.:])?\d{2})'
+LEGACY_TS_PREFIXES = [
+    fr'^{LEGACY_TIMESTAMP_RE}[-_\.~ ]',
+    fr'[a-zA-Z-_]{LEGACY_TIMESTAMP_RE}[-_\.~ ]',
+    fr'^{LEGACY_TIMESTAMP_RE}\b',
+    fr'[a-zA-Z-_]{LEGACY_TIMESTAMP_RE}\b',
+]
+
+
+def legacy_parse_timestamp(basename: str):
+    for ts_re in LEGACY_TS_PREFIXES:
+        res = re.search(ts_re, basename)
+        if res:
+            res = ''.join([l for l in res.group(1) if l.isdigit()])
+            timestamp = int(datetime.datetime.strptime(res, '%Y%m%d%H%M%S').timestamp())
+            if MIN_OK_TIMESTAMP < timestamp < MAX_OK_TIMESTAMP:
+                return timestamp
+            return None
+    re.match(r'.*\d{4}.?\d{2}.?\d{2}.*\d{2}.?\d{2}.?\d{2}.*', basename)
+    return None
+
+
+FORMATS = [
+    'IMG_{dt:%Y%m%d_%H%M%S}_{index:03d}.jpg',
+    '{dt:%Y-%m-%d %H.%M.%S}.jpg',
+    'Screenshot_{dt:%Y%m%d-%H%M%S}.png',
+    'photo_{dt:%Y-%m-%d_%H-%M-%S}.jpg',
+    'PHOTO_{dt:%Y%m%d_%H%M%S}_{index}.jpg',
+    'IMG_{index:04d}.JPG',
+    'DSC{index:05d}.JPG',
+]
+
+
+def generate_names(count: int, seed: int):
+    rng = random.Random(seed)
+    start = datetime.datetime(2010, 1, 1).timestamp()
+    finish = datetime.datetime(2024, 1, 1).timestamp()
+    return [
+        rng.choice(FORMATS).format(
+            dt=datetime.datetime.fromtimestamp(rng.uniform(start, finish)),
+            index=rng.randrange(10000),
+        )
+        for _ in range(count)
+    ]
+
+
+def run(args):
+    names = generate_names(args.count, args.seed)
+    log.info(f'Generated {len(names)} names')
+
+    start = time.perf_counter()
+    result = parse_timestamps(names)
+    duration = time.perf_counter() - start
+    log.info(f'parse_timestamps: {duration:.3f} s, {len(names) / duration:.0f} names/s')
+
+    if args.legacy:
+        start = time.perf_counter()
+        legacy_result = [legacy_parse_timestamp(name) for name in names]
+        legacy_duration = time.perf_counter() - start
+        log.info(f'legacy:           {legacy_duration:.3f} s, {len(names) / legacy_duration:.0f} names/s')
+        log.info(f'Speedup: {legacy_duration / duration:.2f}x')
+        mismatches = sum(1 for new, old in zip(result, legacy_result) if new != old)
+        log.info(f'Mismatches: {mismatches}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Filename timestamp parser benchmark')
+    parser.add_argument('--count', help='Names count', type=int, default=1000000)
+    parser.add_argument('--seed', help='Random seed', type=int, default=0)
+    parser.add_argument('--legacy', help='Compare with legacy implementation', action='store_true')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-7s %(message)s')
+    run(parser.parse_args())
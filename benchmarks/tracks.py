@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import struct
+import sys
+import tempfile
+import time
+
+from typing import Optional
+
+import yaml
+
+import library
+from tools.running import dirname, geodesic
+from tools.running.fitreader import read_fit_file
+from tools.running.process.analyze import DefaultLimits, analyze_track, clean
+from tools.running.track import Track
+from tools.running.track_columns import TrackColumns
+
+import logging
+log = logging.getLogger('benchmark')
+
+
+TRACKS_YAML = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'tracks.yaml')
+DEFAULT_RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', 'tracks.jsonl')
+SIZES = [1000, 10000, 100000]
+PARITY_SIZE = 2000
+HISTORY = 5  # previous runs to compare with
+EXIT_FAILED = 1
+EXIT_NOT_CHECKED = 2  # no FIT files from tracks yaml were found
+
+START_TIMESTAMP = 1575203458
+FIT_EPOCH = 631065600  # 1989-12-31 00:00:00 UTC
+LOCAL_SHIFT = 3 * 3600
+
+
+def generate_rows(count: int, seed: int, spike_share: float):
+    # 1 Hz run at about 3 m/s with GPS spikes of 1-3 points jumping 200-1000 m away
+    rng = random.Random(seed)
+    latitude, longitude = 55.75, 37.6
+    heading = rng.uniform(0, 2 * math.pi)
+    distance_m = 0.
+    rows, spike_timestamps = [], []
+    spike_run, spike_lat, spike_lon = 0, 0., 0.
+    for index in range(count):
+        heading += rng.gauss(0, 0.1)
+        speed = rng.uniform(2.5, 3.5)
+        distance_m += speed
+        latitude += math.degrees(speed * math.cos(heading) / 6371000)
+        longitude += math.degrees(speed * math.sin(heading) / 6371000 / math.cos(math.radians(latitude)))
+        timestamp = START_TIMESTAMP + index
+
+        if spike_run == 0 and index > 2 and rng.random() < spike_share:
+            spike_run = rng.randint(1, 3)
+            jump, direction = rng.uniform(200, 1000), rng.uniform(0, 2 * math.pi)
+            spike_lat = math.degrees(jump * math.cos(direction) / 6371000)
+            spike_lon = math.degrees(jump * math.sin(direction) / 6371000 / math.cos(math.radians(latitude)))
+        if spike_run:
+            spike_run -= 1
+            spike_timestamps.append(timestamp)
+            point_lat, point_lon = latitude + spike_lat, longitude + spike_lon
+        else:
+            point_lat, point_lon = latitude, longitude
+
+        rows.append((
+            point_lon, point_lat, 150 + 10 * math.sin(index / 300),
+            timestamp, rng.randint(80, 90), rng.randint(130, 170), round(distance_m, 2), round(speed, 3),
+        ))
+    return rows, spike_timestamps
+
+
+def generate_track(count: int, seed: int, spike_share: float):
+    rows, spike_timestamps = generate_rows(count, seed, spike_share)
+    track = Track(filename=f'{START_TIMESTAMP}-{count}.FIT', points=TrackColumns.from_rows(rows))
+    return track, spike_timestamps
+
+
+_CRC_TABLE = [
+    0x0000, 0xCC01, 0xD801, 0x1400, 0xF001, 0x3C00, 0x2800, 0xE401,
+    0xA001, 0x6C00, 0x7800, 0xB401, 0x5000, 0x9C01, 0x8801, 0x4400,
+]
+
+
+def fit_crc(data: bytes, crc: int = 0) -> int:
+    for byte in data:
+        for nibble in [byte & 0xF, byte >> 4]:
+            tmp = _CRC_TABLE[crc & 0xF]
+            crc = (crc >> 4) & 0x0FFF
+            crc = crc ^ tmp ^ _CRC_TABLE[nibble]
+    return crc
+
+
+# (field number, struct format, base type)
+RECORD_FIELDS = [(253, 'I', 0x86), (0, 'i', 0x85), (1, 'i', 0x85), (2, 'H', 0x84), (3, 'B', 0x02), (4, 'B', 0x02), (5, 'I', 0x86), (6, 'H', 0x84)]
+ACTIVITY_FIELDS = [(253, 'I', 0x86), (5, 'I', 0x86)]
+RECORD_MESSAGE, ACTIVITY_MESSAGE = 20, 34
+
+
+def _definition(local_type: int, global_number: int, fields) -> bytes:
+    result = struct.pack('<BBBHB', 0x40 | local_type, 0, 0, global_number, len(fields))
+    for number, fmt, base_type in fields:
+        result += struct.pack('<BBB', number, struct.calcsize(fmt), base_type)
+    return result
+
+
+def write_fit_file(filename: str, rows):
+    # minimal FIT: record messages and one activity message with local time
+    record = struct.Struct('<B' + ''.join(fmt for _, fmt, _ in RECORD_FIELDS))
+    chunks = [_definition(0, RECORD_MESSAGE, RECORD_FIELDS)]
+    for longitude, latitude, altitude, timestamp, cadence, heart_rate, distance_m, speed in rows:
+        chunks.append(record.pack(
+            0,
+            timestamp - FIT_EPOCH,
+            round(latitude * 2 ** 31 / 180),
+            round(longitude * 2 ** 31 / 180),
+            round((altitude + 500) * 5),
+            heart_rate,
+            cadence,
+            round(distance_m * 100),
+            round(speed * 1000),
+        ))
+    finish = rows[-1][3] - FIT_EPOCH
+    chunks.append(_definition(1, ACTIVITY_MESSAGE, ACTIVITY_FIELDS))
+    chunks.append(struct.pack('<BII', 1, finish, finish + LOCAL_SHIFT))
+
+    data = b''.join(chunks)
+    header = struct.pack('<BBHI4s', 14, 0x10, 2093, len(data), b'.FIT')
+    header += struct.pack('<H', fit_crc(header))
+    with open(filename, 'wb') as f:
+        f.write(header + data)
+        f.write(struct.pack('<H', fit_crc(data, fit_crc(header))))
+
+
+def measure(func, points_count: int) -> float:
+    start = time.perf_counter()
+    func()
+    return points_count / (time.perf_counter() - start)
+
+
+def run_speed(args) -> dict:
+    results = {}
+    for size in args.size:
+        track, spike_timestamps = generate_track(size, args.seed, args.spike_share)
+
+        if size <= args.max_parse_size:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                filename = os.path.join(tmp_dir, track.filename)
+                write_fit_file(filename, generate_rows(size, args.seed, args.spike_share)[0])
+                results[f'parse/{size}'] = measure(lambda: read_fit_file(filename), size)
+
+        results[f'distance/{size}'] = measure(lambda: Track(filename=track.filename, points=track.points).total_distance, size)
+        results[f'distance-andoyer/{size}'] = measure(
+            lambda: Track(filename=track.filename, points=track.points).get_total_distance(geodesic.Mode.Andoyer),
+            size,
+        )
+
+        broken = []
+        results[f'clean/{size}'] = measure(lambda: broken.extend(analyze_track(track, DefaultLimits)[1]), size)
+        found = {point.timestamp for point in broken} & set(spike_timestamps)
+        log.info(f'{size} points: found {len(found)} of {len(spike_timestamps)} injected spikes, {len(broken)} broken points')
+
+        for name in ['parse', 'distance', 'distance-andoyer', 'clean']:
+            if f'{name}/{size}' in results:
+                log.info(f'{name:>16} {size:>8} points: {results[f"{name}/{size}"]:12.0f} points/s')
+    return results
+
+
+def check_parity(args) -> bool:
+    # worklist cleaning against repeated clean passes, on a noisy track needing several passes
+    track, _ = generate_track(PARITY_SIZE, args.seed, args.spike_share * 5)
+    expected_track, expected_broken = track, []
+    while True:
+        expected_track, broken = clean(expected_track, DefaultLimits)
+        expected_broken += broken
+        if not broken:
+            break
+    _, broken = analyze_track(track, DefaultLimits)
+    ok = [point.timestamp for point in broken] == [point.timestamp for point in expected_broken]
+    log.info(f'Parity with clean on {PARITY_SIZE} points: {"ok" if ok else "FAILED"}')
+    return ok
+
+
+def check_expectations(args) -> Optional[bool]:
+    # None if no track was checked
+    with open(args.tracks_yaml) as f:
+        expectations = yaml.safe_load(f)['validate']
+
+    files_by_name = {}
+    if os.path.isdir(args.tracks_dir):
+        for filename in library.files.walk(args.tracks_dir, extensions=['.FIT', '.fit']):
+            basename = os.path.basename(filename)
+            files_by_name[basename] = filename
+            files_by_name[basename.rsplit('.', 1)[0]] = filename
+
+    ok = True
+    checked = 0
+    for expectation in expectations:
+        filename = files_by_name.get(expectation['name'])
+        if filename is None:
+            log.warning(f'No file for {expectation["name"]!r} in {args.tracks_dir!r}, skipping')
+            continue
+        checked += 1
+        _, broken = analyze_track(read_fit_file(filename, raise_on_error=False), DefaultLimits)
+        result = sorted(point.timestamp for point in broken)
+        expected = sorted(expectation['broken_timestamps'] or [])
+        if result != expected:
+            ok = False
+            log.error(
+                f'{expectation["name"]}: unexpected broken timestamps'
+                f'\n\tmissing: {sorted(set(expected) - set(result))}'
+                f'\n\textra:   {sorted(set(result) - set(expected))}'
+            )
+    if not checked:
+        log.error(f'NO EXPECTATIONS CHECKED: none of {len(expectations)} tracks from {args.tracks_yaml} found in {args.tracks_dir!r}')
+        return None
+    log.info(f'Checked {checked} of {len(expectations)} tracks from {args.tracks_yaml}: {"ok" if ok else "FAILED"}')
+    return ok
+
+
+def get_commit() -> str:
+    try:
+        return library.process.run(['git', 'rev-parse', '--short', 'HEAD']).stdout.decode().strip()
+    except (OSError, RuntimeError):
+        return ''
+
+
+def check_regressions(results: dict, history: list, tolerance: float) -> list:
+    regressions = []
+    for name, value in sorted(results.items()):
+        previous = sorted(row['results'][name] for row in history if name in row['results'])
+        if not previous:
+            continue
+        median = previous[len(previous) // 2]
+        if value < (1 - tolerance) * median:
+            regressions.append(name)
+            log.warning(f'Regression in {name}: {value:.0f} points/s, median of previous runs is {median:.0f}')
+    return regressions
+
+
+def save_results(results_file: str, results: dict, tolerance: float) -> list:
+    host = platform.node()
+    history = []
+    if os.path.exists(results_file):
+        with open(results_file) as f:
+            history = [row for row in map(json.loads, f) if row['host'] == host][-HISTORY:]
+
+    regressions = check_regressions(results, history, tolerance)
+    row = {
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': get_commit(),
+        'host': host,
+        'python': platform.python_version(),
+        'results': {name: round(value, 1) for name, value in sorted(results.items())},
+        'regressions': regressions,
+    }
+    os.makedirs(os.path.dirname(results_file), exist_ok=True)
+    with open(results_file, 'a') as f:
+        f.write(json.dumps(row) + '\n')
+    log.info(f'Saved results to {results_file}')
+    return regressions
+
+
+def run(args) -> int:
+    parity_ok = check_parity(args)
+    expectations_ok = check_expectations(args)
+    results = run_speed(args)
+    if args.results:
+        save_results(args.results, results, args.tolerance)
+    if not parity_ok or expectations_ok is False:
+        return EXIT_FAILED
+    if expectations_ok is None:
+        log.error(f'Speed is measured, but no expectations were checked, see --tracks-dir')
+        return EXIT_NOT_CHECKED
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Track parsing, cleaning and distance benchmark')
+    parser.add_argument('--size', help='Synthetic track points count', type=int, action='append')
+    parser.add_argument('--max-parse-size', help='Skip FIT parsing for larger tracks, fitparse is slow', type=int, default=100000)
+    parser.add_argument('--seed', help='Random seed', type=int, default=0)
+    parser.add_argument('--spike-share', help='Share of points starting a GPS spike', type=float, default=0.005)
+    parser.add_argument('--tracks-yaml', help='Expected broken timestamps', default=TRACKS_YAML)
+    parser.add_argument('--tracks-dir', help='Dir with FIT files from tracks yaml', default=dirname.SYNC_LOCAL_DIR)
+    parser.add_argument('--results', help='JSONL file to append results to, empty to skip', default=DEFAULT_RESULTS)
+    parser.add_argument('--tolerance', help='Slowdown vs median of previous runs to flag', type=float, default=0.25)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-7s %(message)s')
+    args = parser.parse_args()
+    args.size = args.size or SIZES
+    sys.exit(run(args))
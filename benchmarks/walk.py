@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import tempfile
+import time
+
+import library.files
+from library.files import scan_files
+
+import logging
+log = logging.getLogger('benchmark')
+
+EXTENSIONS = ['JPG', 'jpg', 'jpeg', 'png', 'dng']
+NAMES = ['IMG_{index:04d}.JPG', 'IMG_{index:04d}.AAE', 'photo_{index}.jpg', 'VIDEO_{index}.MOV']
+
+
+def create_tree(root: str, count: int, files_per_dir: int):
+    for index in range(count):
+        dir_index = index // files_per_dir
+        dirname = os.path.join(root, f'{2000 + dir_index // 500}', f'{dir_index % 500 // 50:02d}', f'event_{dir_index:05d}')
+        if index % files_per_dir == 0:
+            os.makedirs(dirname)
+        basename = NAMES[index % len(NAMES)].format(index=index)
+        with open(os.path.join(dirname, basename), 'wb'):
+            pass
+
+
+# previous implementations
+def legacy_walk(dirname, extensions):
+    for root, _, files in os.walk(dirname):
+        for filename in files:
+            if not extensions or any(filename.endswith(extension) for extension in extensions):
+                yield os.path.join(root, filename)
+
+
+def legacy_get_filenames(dirs, skip_paths):
+    skip_set = set(skip_paths)
+    for dir_name in dirs:
+        for root, _, files in os.walk(dir_name):
+            if any(path in root for path in skip_set):
+                continue
+            for filename in sorted(files):
+                yield os.path.join(root, filename)
+
+
+def measure(name: str, func) -> list:
+    start = time.perf_counter()
+    result = list(func())
+    duration = time.perf_counter() - start
+    log.info(f'{name:<36} {duration:7.3f} s, {len(result) / duration:9.0f} files/s, {len(result)} files')
+    return result
+
+
+def slow_scandir(scandir, latency: float):
+    def wrapper(*args, **kwargs):
+        time.sleep(latency)
+        return scandir(*args, **kwargs)
+    return wrapper
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as root:
+        start = time.perf_counter()
+        create_tree(root, args.count, args.files_per_dir)
+        log.info(f'Created {args.count} files in {time.perf_counter() - start:.1f} s')
+        skip_paths = [os.path.join(root, '2001')]
+
+        old = measure('legacy walk, extensions', lambda: legacy_walk(root, EXTENSIONS))
+        new = measure('walk, extensions', lambda: library.files.walk(root, extensions=EXTENSIONS))
+        assert sorted(old) == sorted(path for path in new if not path.endswith('.jpeg'))
+
+        old = measure('legacy get_filenames, skip', lambda: legacy_get_filenames([root], skip_paths))
+        new = measure('scan_files, skip', lambda: (entry.path for entry in scan_files([root], skip_paths=skip_paths)))
+        assert sorted(old) == sorted(new)
+
+        measure('os.walk + os.stat', lambda: (
+            os.stat(path).st_size for path in legacy_walk(root, [])
+        ))
+        measure('scan_files, with stat', lambda: (
+            entry.stat().st_size for entry in scan_files([root], with_stat=True)
+        ))
+
+        if args.latency:
+            # cloud-synced mounts: every directory listing waits for network
+            scandir = os.scandir
+            os.scandir = slow_scandir(scandir, args.latency / 1000)
+            try:
+                subtree = [os.path.join(root, '2000')]
+                for workers in [0, 4, 16]:
+                    measure(f'scan_files, {args.latency} ms, {workers} workers', lambda: scan_files(subtree, workers=workers))
+            finally:
+                os.scandir = scandir
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Tree walker benchmark')
+    parser.add_argument('--count', help='Files count', type=int, default=500000)
+    parser.add_argument('--files-per-dir', help='Files per dir', type=int, default=100)
+    parser.add_argument('--latency', help='Simulated latency of listing a dir, ms', type=float, default=5)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-7s %(message)s')
+    run(parser.parse_args())
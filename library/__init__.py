@@ -1,5 +1,8 @@
+import library.copier
+import library.duplicates
 import library.files
 import library.md5sum
+import library.minhash
 import library.mover
 import library.process
 import library.youtube
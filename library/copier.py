@@ -0,0 +1,136 @@
+import collections
+import concurrent.futures
+import hashlib
+import os
+import shutil
+import time
+
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+import library.md5sum
+
+import logging
+log = logging.getLogger(__name__)
+
+
+WORKERS = 4
+
+
+@dataclass
+class CopyJob:
+    src: str
+    dst: str
+    md5: Optional[str] = None  # expected digest, from manifest
+
+
+@dataclass
+class CopyResult:
+    src: str
+    dst: str
+    md5: str
+    size: int
+    mtime_ns: int
+
+
+def copy_file(src: str, dst: str, *, expected_md5: Optional[str] = None, buffer_size: int = library.md5sum.BUFFER_SIZE) -> CopyResult:
+    # src is read once: the same chunks are hashed and written, dst appears only if all checks pass
+    if os.path.exists(dst):
+        raise RuntimeError(f'Dst already exists: {dst!r}')
+
+    tmp_dst = f'{dst}.part'  # may be left by a killed run, overwritten
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    md5 = hashlib.md5()
+    size = 0
+    try:
+        with open(src, 'rb', buffering=0) as src_file, open(tmp_dst, 'wb', buffering=0) as dst_file:
+            src_size = os.fstat(src_file.fileno()).st_size
+            while read_size := src_file.readinto(buffer):
+                chunk = view[:read_size]
+                md5.update(chunk)
+                written = 0
+                while written < read_size:
+                    written += dst_file.write(chunk[written:])
+                size += read_size
+            os.fsync(dst_file.fileno())
+            dst_size = os.fstat(dst_file.fileno()).st_size
+
+        if not (size == src_size == dst_size):
+            raise RuntimeError(f'Size mismatch for {src!r}: expected {src_size}, read {size}, written {dst_size}')
+        if expected_md5 and md5.hexdigest() != expected_md5:
+            raise RuntimeError(f'Digest mismatch for {src!r}: expected {expected_md5}, got {md5.hexdigest()}')
+
+        shutil.copystat(src, tmp_dst)
+        os.replace(tmp_dst, dst)
+    except BaseException:
+        if os.path.exists(tmp_dst):
+            os.remove(tmp_dst)
+        raise
+
+    return CopyResult(src=src, dst=dst, md5=md5.hexdigest(), size=size, mtime_ns=os.stat(dst).st_mtime_ns)
+
+
+def _device(path: str) -> int:
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return os.stat(path or '.').st_dev
+
+
+def copy_files(
+    jobs: List[CopyJob],
+    *,
+    workers: int = WORKERS,
+    on_copied: Optional[Callable[[CopyResult], None]] = None,
+) -> List[CopyResult]:
+    # One stream per (src device, dst device) pair: no seeks between files on one disk,
+    # different pairs run in parallel. on_copied is called in caller thread as files are done.
+    start_time = time.time()
+    for dirname in sorted({os.path.dirname(job.dst) for job in jobs}):
+        os.makedirs(dirname, exist_ok=True)
+
+    queues = collections.defaultdict(collections.deque)
+    for job in jobs:
+        queues[(_device(job.src), _device(job.dst))].append(job)
+    log.info(f'Copying {len(jobs)} files in {len(queues)} device pairs')
+
+    results, failed = [], []
+    waiting = collections.deque(queues)
+    running = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        def submit(key):
+            job = queues[key].popleft()
+            running[executor.submit(copy_file, job.src, job.dst, expected_md5=job.md5)] = key, job
+
+        while waiting and len(running) < max(workers, 1):
+            submit(waiting.popleft())
+
+        while running:
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                key, job = running.pop(future)
+                try:
+                    result = future.result()
+                except (OSError, RuntimeError) as e:
+                    log.error(f'Failed to copy {job.src!r} -> {job.dst!r}: {e}')
+                    failed.append(job)
+                else:
+                    log.debug(f'Copied {result.src!r} -> {result.dst!r}: {result.md5}')
+                    results.append(result)
+                    if on_copied:
+                        on_copied(result)
+
+                if queues[key]:
+                    submit(key)
+                elif waiting:
+                    submit(waiting.popleft())
+
+    copied_bytes = sum(result.size for result in results)
+    duration = max(time.time() - start_time, 1e-6)
+    log.info(
+        f'Copied {len(results)} files, {copied_bytes / 2 ** 20:.1f} MB in {duration:.1f} seconds: '
+        f'{copied_bytes / 2 ** 20 / duration:.1f} MB/s'
+    )
+    if failed:
+        raise RuntimeError(f'Failed to copy {len(failed)} of {len(jobs)} files')
+    return results
@@ -0,0 +1,103 @@
+import collections
+import os
+
+from functools import cached_property
+from typing import Dict, List, Optional
+
+import library.files
+import library.md5sum
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class DuplicateFinder:
+    # Groups by size, then by md5 of head and tail, and reads whole files only for remaining collisions.
+    def __init__(self):
+        self._paths_by_size: Dict[int, List[str]] = collections.defaultdict(list)
+        self.total_bytes = 0
+        self.read_bytes = 0
+
+    def add(self, path: str, size: Optional[int] = None):
+        if size is None:
+            size = os.path.getsize(path)
+        self._paths_by_size[size].append(path)
+        self.total_bytes += size
+
+    def add_dir(self, dirname: str):
+        for path in library.files.walk(dirname):
+            self.add(path)
+
+    def _partial_md5sum(self, path: str, size: int) -> str:
+        self.read_bytes += library.md5sum.partial_read_size(size)
+        return library.md5sum.partial_md5sum(path, size=size)
+
+    def _md5sum(self, path: str, size: int) -> str:
+        self.read_bytes += size
+        return library.md5sum.md5sum(path)
+
+    @cached_property
+    def keys(self) -> Dict[str, str]:
+        # Equal keys mean equal content. Only files with duplicates get a real md5sum.
+        keys = {}
+        for size, paths in self._paths_by_size.items():
+            if len(paths) == 1:
+                keys[paths[0]] = f'size:{size}'
+                continue
+
+            paths_by_partial = collections.defaultdict(list)
+            for path in paths:
+                paths_by_partial[self._partial_md5sum(path, size)].append(path)
+
+            for partial_md5sum, same_paths in paths_by_partial.items():
+                if len(same_paths) == 1:
+                    keys[same_paths[0]] = f'partial:{size}:{partial_md5sum}'
+                elif library.md5sum.partial_read_size(size) == size:
+                    for path in same_paths:
+                        keys[path] = partial_md5sum
+                else:
+                    for path in same_paths:
+                        keys[path] = self._md5sum(path, size)
+
+        share = self.read_bytes / self.total_bytes if self.total_bytes else 0
+        log.info(f'Checked {len(keys)} files: read {self.read_bytes} of {self.total_bytes} bytes ({100 * share:.2f}%)')
+        return keys
+
+    @cached_property
+    def groups(self) -> List[List[str]]:
+        paths_by_key = collections.defaultdict(list)
+        for path, key in self.keys.items():
+            paths_by_key[key].append(path)
+
+        return sorted(
+            sorted(paths)
+            for paths in paths_by_key.values()
+            if len(paths) >= 2
+        )
+
+
+def same_content(first: str, second: str) -> bool:
+    size = os.path.getsize(first)
+    if size != os.path.getsize(second):
+        return False
+
+    if library.md5sum.partial_md5sum(first, size=size) != library.md5sum.partial_md5sum(second, size=size):
+        return False
+
+    if library.md5sum.partial_read_size(size) == size:
+        return True
+
+    return library.md5sum.md5sum(first) == library.md5sum.md5sum(second)
+
+
+def same_bytes(first: str, second: str, buffer_size: int = library.md5sum.BUFFER_SIZE) -> bool:
+    # byte-for-byte, to confirm equal digests before irreversible actions
+    with open(first, 'rb') as first_file, open(second, 'rb') as second_file:
+        if os.fstat(first_file.fileno()).st_size != os.fstat(second_file.fileno()).st_size:
+            return False
+        while True:
+            first_chunk = first_file.read(buffer_size)
+            if first_chunk != second_file.read(buffer_size):
+                return False
+            if not first_chunk:
+                return True
@@ -1,14 +1,18 @@
+import concurrent.futures
 import enum
 import os
 import platform
 import subprocess
 import json
 
-from typing import List, Optional
+from dataclasses import dataclass, field
+from typing import Collection, Dict, Iterator, List, Optional, Tuple
 
 import logging
 log = logging.getLogger(__name__)
 
+IN_FLIGHT_PER_WORKER = 4
+
 
 class Platform(str, enum.Enum):
     Windows = 'win'
@@ -35,6 +39,87 @@ class Location:
     }[_get_platform()]
 
 
+def _normalize_extensions(extensions: Optional[Collection[str]]) -> Optional[frozenset]:
+    if not extensions:
+        return None
+    return frozenset(extension.lstrip('.').lower() for extension in extensions)
+
+
+def _list_dir(
+    dirname: str,
+    extensions: Optional[frozenset],
+    skip_paths: Collection[str],
+    with_stat: bool,
+) -> Tuple[List[os.DirEntry], List[str]]:
+    files, subdirs = [], []
+    try:
+        with os.scandir(dirname) as entries:
+            for entry in sorted(entries, key=lambda entry: entry.name):
+                if entry.is_dir():
+                    if entry.is_symlink():
+                        continue
+                    if any(path in entry.path for path in skip_paths):
+                        log.info(f'{entry.path} is excluded')
+                        continue
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    if extensions is not None:
+                        _, dot, extension = entry.name.rpartition('.')
+                        if not dot or extension.lower() not in extensions:
+                            continue
+                    if with_stat:
+                        entry.stat()  # cached in entry
+                    files.append(entry)
+                else:
+                    log.warning(f'Skipping {entry.path!r}: not a file or dir, e.g. broken symlink')
+    except OSError as e:
+        log.warning(f'Could not list {dirname!r}: {e}')
+    return files, subdirs
+
+
+def scan_files(
+    dirnames: List[str],
+    *,
+    extensions: Optional[Collection[str]] = None,
+    skip_paths: Optional[Collection[str]] = None,
+    with_stat: bool = False,
+    workers: int = 0,
+) -> Iterator[os.DirEntry]:
+    # Files in sorted order: files of dir, then its subdirs, like os.walk top-down.
+    # Extensions are case-insensitive, dirs containing any of skip_paths are not listed.
+    # workers > 1 lists next dirs in threads ahead of time, for slow cloud mounts:
+    # at most workers * IN_FLIGHT_PER_WORKER listings are running or waiting to be consumed.
+    extensions = _normalize_extensions(extensions)
+    skip_paths = list(skip_paths or [])
+    dirnames = [str(dirname) for dirname in dirnames if not any(path in str(dirname) for path in skip_paths)]
+
+    if workers <= 1:
+        stack = list(reversed(dirnames))
+        while stack:
+            files, subdirs = _list_dir(stack.pop(), extensions, skip_paths, with_stat)
+            yield from files
+            stack.extend(reversed(subdirs))
+        return
+
+    max_in_flight = workers * IN_FLIGHT_PER_WORKER
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        def submit(dirname):
+            return executor.submit(_list_dir, dirname, extensions, skip_paths, with_stat)
+
+        stack = list(reversed(dirnames))
+        listings = {}
+        while stack:
+            for dirname in reversed(stack[-max_in_flight:]):
+                if len(listings) >= max_in_flight:
+                    break
+                if dirname not in listings:
+                    listings[dirname] = submit(dirname)
+
+            dirname = stack.pop()
+            files, subdirs = (listings.pop(dirname, None) or submit(dirname)).result()
+            yield from files
+            stack.extend(reversed(subdirs))
+
 def walk(dirname, extensions=[], dirsOnly=False):
     dirName = str(dirname)
     logName = 'dirs' if dirsOnly else 'files'
@@ -43,16 +128,15 @@ def walk(dirname, extensions=[], dirsOnly=False):
     count = 0
     if not os.path.exists(dirName):
         log.error('Path %r is missing', dirName)
-    for root, dirs, files in os.walk(dirName):
-        if dirsOnly:
+    if dirsOnly:
+        for root, dirs, _ in os.walk(dirName):
             for directory in dirs:
                 count += 1
                 yield os.path.join(root, directory)
-        else:
-            for filename in files:
-                if not extensions or any(filename.endswith(extension) for extension in extensions):
-                    count += 1
-                    yield os.path.join(root, filename)
+    else:
+        for entry in scan_files([dirName], extensions=extensions):
+            count += 1
+            yield entry.path
 
     log.debug('Found %d %s in %s', count, logName, dirName)
 
@@ -72,6 +156,7 @@ def get_filenames(
     dirs: Optional[List[str]] = None,
     files: Optional[List[str]] = None,
     skip_paths: Optional[List[str]] = None,
+    workers: int = 0,
 ):
     filenames_count = 0
 
@@ -79,20 +164,11 @@ def get_filenames(
         filenames_count += 1
         yield filename
 
-    skip_set = set(skip_paths) if skip_paths else set()
-    for dir_name in dirs:
-        for root, _, files in os.walk(dir_name):
-            if any(path in root for path in skip_set):
-                log.info(f'{root} is excluded')
-                continue
-
-            files = sorted(list(files))
-            log.info(f'Found {len(files)} files in {root}')
-            for filename in files:
-                filenames_count += 1
-                yield os.path.join(root, filename)
-                if filenames_count % 500 == 0:
-                    log.info(f'Yielded {filenames_count} photo files')
+    for entry in scan_files(dirs, skip_paths=skip_paths, workers=workers):
+        filenames_count += 1
+        yield entry.path
+        if filenames_count % 500 == 0:
+            log.info(f'Yielded {filenames_count} photo files')
 
     log.info(f'Yielded {filenames_count} photo files')
 
@@ -105,3 +181,149 @@ def save_json(filename: str, data):
             sort_keys=True,
             ensure_ascii=False,
         ))
+
+
+def is_jsonl(filename: str) -> bool:
+    return filename.endswith('.jsonl')
+
+
+def read_jsonl(filename: str) -> Iterator[dict]:
+    with open(filename) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.endswith('\n'):
+                log.warning(f'Skipping incomplete line {line_number} in {filename!r}')
+                break
+            yield json.loads(line)
+
+
+def read_json_rows(filename: str) -> Iterator[dict]:
+    if is_jsonl(filename):
+        yield from read_jsonl(filename)
+    else:
+        with open(filename) as f:
+            yield from json.load(f)
+
+
+class JsonlWriter:
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._drop_incomplete_line()
+        self._file = open(filename, 'a')
+
+    def _drop_incomplete_line(self):
+        if not os.path.exists(self.filename):
+            return
+
+        with open(self.filename, 'rb+') as f:
+            size = f.seek(0, os.SEEK_END)
+            position = size
+            while position > 0:
+                chunk_start = max(position - 2 ** 16, 0)
+                f.seek(chunk_start)
+                chunk = f.read(position - chunk_start)
+                newline_index = chunk.rfind(b'\n')
+                if newline_index >= 0:
+                    position = chunk_start + newline_index + 1
+                    break
+                position = chunk_start
+
+            if position != size:
+                log.warning(f'Dropping incomplete line of {size - position} bytes in {self.filename!r}')
+                f.truncate(position)
+
+    def write(self, row):
+        self._file.write(json.dumps(row, sort_keys=True, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+@dataclass
+class SnapshotChanges:
+    added: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    renamed: Dict[str, str] = field(default_factory=dict)  # old path -> new path, same content
+
+    def __bool__(self):
+        return bool(self.added or self.modified or self.removed or self.renamed)
+
+    def __str__(self):
+        return (
+            f'{len(self.added)} added, {len(self.modified)} modified, '
+            f'{len(self.removed)} removed, {len(self.renamed)} renamed files'
+        )
+
+
+@dataclass
+class Snapshot:
+    files: Dict[str, Tuple[int, int, int]] = field(default_factory=dict)  # path -> size, mtime_ns, inode
+
+    @classmethod
+    def from_paths(cls, paths: Iterator[str]):
+        snapshot = cls()
+        for path in paths:
+            stat = os.stat(path)
+            snapshot.files[path] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        return snapshot
+
+    @classmethod
+    def scan(cls, dirnames: List[str], **kwargs):
+        snapshot = cls()
+        for entry in scan_files(dirnames, with_stat=True, **kwargs):
+            stat = entry.stat()
+            snapshot.files[entry.path] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        return snapshot
+
+    @classmethod
+    def load(cls, filename: str):
+        with open(filename) as f:
+            files = json.load(f)
+        log.info(f'Loaded snapshot of {len(files)} files from {filename!r}')
+        return cls(files={path: tuple(state) for path, state in files.items()})
+
+    def save(self, filename: str):
+        tmp_filename = f'{filename}.tmp'
+        with open(tmp_filename, 'w') as f:
+            json.dump(self.files, f, sort_keys=True, ensure_ascii=False)
+        os.replace(tmp_filename, filename)
+        log.info(f'Saved snapshot of {len(self.files)} files to {filename!r}')
+
+    def changes_since(self, previous: 'Snapshot') -> SnapshotChanges:
+        changes = SnapshotChanges()
+        added = []
+        for path, state in self.files.items():
+            previous_state = previous.files.get(path)
+            if previous_state is None:
+                added.append(path)
+            elif previous_state != state:
+                changes.modified.append(path)
+
+        # same inode, size and mtime under new path: renamed, content is the same
+        removed_by_state = {
+            state: path
+            for path, state in previous.files.items()
+            if path not in self.files and state[2]
+        }
+        for path in added:
+            old_path = removed_by_state.pop(self.files[path], None)
+            if old_path is None:
+                changes.added.append(path)
+            else:
+                changes.renamed[old_path] = path
+
+        renamed_paths = set(changes.renamed)
+        changes.removed = [path for path in previous.files if path not in self.files and path not in renamed_paths]
+
+        changes.added.sort()
+        changes.modified.sort()
+        changes.removed.sort()
+        log.info(f'Changes since previous snapshot: {changes}')
+        return changes
@@ -1,14 +1,144 @@
+import collections
+import concurrent.futures
 import hashlib
+import mmap
+import os
+import threading
+import time
+
+from typing import Dict, Iterable, Iterator, Tuple
 
 import logging
 log = logging.getLogger(__file__)
 
+PARTIAL_SIZE = 2 ** 16
+BUFFER_SIZE = 2 ** 20
+ALGORITHMS = ['md5', 'blake2b', 'sha256']
+PARTIAL = 'partial'  # head and tail fingerprint, same as partial_md5sum
+
+MMAP_MIN_SIZE = 2 ** 26
+# hashlib releases GIL for large buffers, threads are enough
+WORKERS = 4
+IN_FLIGHT_PER_WORKER = 4
+
+_local = threading.local()
+
+
+def _get_buffer(buffer_size: int) -> bytearray:
+    # one buffer per thread, reused between files
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None or len(buffer) != buffer_size:
+        buffer = bytearray(buffer_size)
+        _local.buffer = buffer
+    return buffer
+
+
+def file_digests(
+    filename: str,
+    algorithms: Iterable[str] = ('md5',),
+    *,
+    partial: bool = False,
+    buffer_size: int = BUFFER_SIZE,
+) -> Dict[str, str]:
+    # all digests in one read of the file
+    hashes = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+    buffer = _get_buffer(buffer_size)
+    view = memoryview(buffer)
+    with open(filename, 'rb', buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        if partial:
+            partial_md5 = hashlib.md5()
+            # whole small file, otherwise first and last PARTIAL_SIZE bytes
+            head_end = size if size <= 2 * PARTIAL_SIZE else PARTIAL_SIZE
+            tail_start = size if size <= 2 * PARTIAL_SIZE else size - PARTIAL_SIZE
+
+        position = 0
+        while read_size := f.readinto(buffer):
+            chunk = view[:read_size]
+            for hash_object in hashes.values():
+                hash_object.update(chunk)
+
+            if partial:
+                end = position + read_size
+                if position < head_end:
+                    partial_md5.update(chunk[:head_end - position])
+                if end > tail_start:
+                    partial_md5.update(chunk[max(tail_start - position, 0):])
+            position += read_size
+
+    result = {algorithm: hash_object.hexdigest() for algorithm, hash_object in hashes.items()}
+    if partial:
+        result[PARTIAL] = partial_md5.hexdigest()
+    return result
+
+
+def md5sum(filename, buffer_size: int = BUFFER_SIZE):
+    result = file_digests(filename, buffer_size=buffer_size)['md5']
+    log.debug(f'md5sum of {filename!r} is {result}')
+    return result
+
+
+def _mapped_md5sum(filename: str) -> str:
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if hasattr(mapped, 'madvise'):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        return hashlib.md5(mapped).hexdigest()
+
+
+def _sized_md5sum(filename: str) -> Tuple[str, int]:
+    size = os.path.getsize(filename)
+    if size >= MMAP_MIN_SIZE:
+        return _mapped_md5sum(filename), size
+    return md5sum(filename), size
+
+
+def md5sum_many(filenames: Iterable[str], workers: int = WORKERS) -> Iterator[Tuple[str, str]]:
+    # (filename, md5sum) in input order, at most workers * IN_FLIGHT_PER_WORKER files are hashed ahead
+    start_time = time.time()
+    files_count, read_bytes = 0, 0
+    max_in_flight = max(workers, 1) * IN_FLIGHT_PER_WORKER
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        pending = collections.deque()
+        filenames_iter = iter(filenames)
+        for filename in filenames_iter:
+            pending.append((filename, executor.submit(_sized_md5sum, filename)))
+            if len(pending) >= max_in_flight:
+                break
+
+        while pending:
+            filename, future = pending.popleft()
+            result, size = future.result()
+            files_count += 1
+            read_bytes += size
+            for next_filename in filenames_iter:
+                pending.append((next_filename, executor.submit(_sized_md5sum, next_filename)))
+                break
+            yield filename, result
+
+    duration = max(time.time() - start_time, 1e-6)
+    log.info(
+        f'Hashed {files_count} files, {read_bytes / 2 ** 20:.1f} MB in {duration:.1f} seconds: '
+        f'{files_count / duration:.1f} files/s, {read_bytes / 2 ** 20 / duration:.1f} MB/s'
+    )
+
+
+def partial_md5sum(filename, size=None) -> str:
+    # md5 of the first and the last PARTIAL_SIZE bytes, equals md5sum for small files
+    if size is None:
+        size = os.path.getsize(filename)
 
-def md5sum(filename):
     hash_md5 = hashlib.md5()
     with open(filename, 'rb') as f:
-        for chunk in iter(lambda: f.read(2 ** 16), b''):
-            hash_md5.update(chunk)
+        if size <= 2 * PARTIAL_SIZE:
+            hash_md5.update(f.read())
+        else:
+            hash_md5.update(f.read(PARTIAL_SIZE))
+            f.seek(-PARTIAL_SIZE, os.SEEK_END)
+            hash_md5.update(f.read(PARTIAL_SIZE))
     result = hash_md5.hexdigest()
-    log.debug(f'md5sum of {md5sum!r} is {md5sum}')
+    log.debug(f'partial md5sum of {filename!r} is {result}')
     return result
+
+
+def partial_read_size(size: int) -> int:
+    return size if size <= 2 * PARTIAL_SIZE else 2 * PARTIAL_SIZE
@@ -0,0 +1,155 @@
+import hashlib
+import os
+
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Dict, Iterable, List, Set
+
+import numpy
+
+import logging
+log = logging.getLogger(__name__)
+
+
+# 32 bands of 4 rows: dirs with jaccard 0.5 become candidates with 0.87 probability, with 0.2 - with 0.05
+NUM_HASHES = 128
+BANDS = 32
+ROWS = NUM_HASHES // BANDS
+# dirs up to this size keep all digests: exact similarity instead of estimate
+EXACT_MAX_SIZE = 256
+CHUNK_SIZE = 4096
+
+_rng = numpy.random.default_rng(0x6d696e68)
+# multiply-shift hashing of 64-bit values: (a * x + b) mod 2 ** 64, top 32 bits
+HASH_A = _rng.integers(0, 2 ** 64, size=NUM_HASHES, dtype=numpy.uint64) | numpy.uint64(1)
+HASH_B = _rng.integers(0, 2 ** 64, size=NUM_HASHES, dtype=numpy.uint64)
+
+
+def digest_value(digest: str) -> int:
+    if len(digest) == 32:
+        try:
+            return int(digest[:16], 16)
+        except ValueError:
+            pass
+    return int.from_bytes(hashlib.blake2b(digest.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def digest_values(digests: Iterable[str]) -> numpy.ndarray:
+    return numpy.unique(numpy.fromiter((digest_value(digest) for digest in digests), dtype=numpy.uint64))
+
+
+def signature(values: numpy.ndarray) -> numpy.ndarray:
+    result = numpy.full(NUM_HASHES, numpy.iinfo(numpy.uint32).max, dtype=numpy.uint32)
+    for start in range(0, len(values), CHUNK_SIZE):
+        chunk = values[start:start + CHUNK_SIZE]
+        hashed = (HASH_A[:, None] * chunk[None, :] + HASH_B[:, None]) >> numpy.uint64(32)
+        numpy.minimum(result, hashed.min(axis=1).astype(numpy.uint32), out=result)
+    return result
+
+
+@dataclass
+class Match:
+    name: str
+    jaccard: float
+    containment: float  # share of query dir files found in matched dir
+    exact: bool
+
+
+@dataclass
+class DirSketches:
+    names: List[str]
+    counts: numpy.ndarray
+    signatures: numpy.ndarray
+    exact: Dict[int, numpy.ndarray] = field(default_factory=dict)
+
+    @classmethod
+    def from_tree(cls, tree: Dict[str, Iterable[str]]):
+        names = sorted(name for name, digests in tree.items() if digests)
+        counts = numpy.zeros(len(names), dtype=numpy.int64)
+        signatures = numpy.zeros((len(names), NUM_HASHES), dtype=numpy.uint32)
+        exact = {}
+        for index, name in enumerate(names):
+            values = digest_values(tree[name])
+            counts[index] = len(values)
+            signatures[index] = signature(values)
+            if len(values) <= EXACT_MAX_SIZE:
+                exact[index] = values
+
+        log.info(f'Built sketches for {len(names)} dirs, {len(exact)} of them are exact')
+        return cls(names=names, counts=counts, signatures=signatures, exact=exact)
+
+    def save(self, filename: str):
+        exact_indices = numpy.array(sorted(self.exact), dtype=numpy.int64)
+        exact_values = [self.exact[index] for index in exact_indices]
+        exact_offsets = numpy.cumsum([0] + [len(values) for values in exact_values], dtype=numpy.int64)
+
+        tmp_filename = f'{filename}.tmp'
+        with open(tmp_filename, 'wb') as f:
+            numpy.savez(
+                f,
+                names=numpy.array(self.names, dtype=str),
+                counts=self.counts,
+                signatures=self.signatures,
+                exact_indices=exact_indices,
+                exact_offsets=exact_offsets,
+                exact_values=numpy.concatenate(exact_values) if exact_values else numpy.zeros(0, dtype=numpy.uint64),
+            )
+        os.replace(tmp_filename, filename)
+
+    @classmethod
+    def load(cls, filename: str):
+        with numpy.load(filename) as data:
+            offsets = data['exact_offsets']
+            exact_values = data['exact_values']
+            exact = {
+                int(index): exact_values[offsets[position]:offsets[position + 1]]
+                for position, index in enumerate(data['exact_indices'])
+            }
+            return cls(
+                names=data['names'].tolist(),
+                counts=data['counts'],
+                signatures=data['signatures'],
+                exact=exact,
+            )
+
+    @cached_property
+    def _buckets(self) -> Dict[bytes, List[int]]:
+        buckets = {}
+        for index, row in enumerate(self.signatures):
+            for band in range(BANDS):
+                key = band.to_bytes(2, 'little') + row[band * ROWS:(band + 1) * ROWS].tobytes()
+                buckets.setdefault(key, []).append(index)
+        return buckets
+
+    def candidates(self, row: numpy.ndarray) -> Set[int]:
+        result = set()
+        for band in range(BANDS):
+            key = band.to_bytes(2, 'little') + row[band * ROWS:(band + 1) * ROWS].tobytes()
+            result.update(self._buckets.get(key, []))
+        return result
+
+    def find_similar(self, query: 'DirSketches', query_index: int) -> List[Match]:
+        query_count = int(query.counts[query_index])
+        query_row = query.signatures[query_index]
+        query_exact = query.exact.get(query_index)
+
+        matches = []
+        for index in self.candidates(query_row):
+            count = int(self.counts[index])
+            exact = self.exact.get(index)
+            if query_exact is not None and exact is not None:
+                common = len(numpy.intersect1d(query_exact, exact, assume_unique=True))
+                jaccard = common / (query_count + count - common)
+            else:
+                jaccard = float(numpy.mean(query_row == self.signatures[index]))
+                # |A & B| from jaccard = |A & B| / (|A| + |B| - |A & B|)
+                common = min(jaccard * (query_count + count) / (1 + jaccard), query_count, count)
+            matches.append(Match(
+                name=self.names[index],
+                jaccard=jaccard,
+                containment=common / query_count,
+                exact=query_exact is not None and exact is not None,
+            ))
+
+        matches.sort(key=lambda match: (-match.containment, -match.jaccard, match.name))
+        return matches
@@ -1,23 +1,30 @@
 import collections
 import difflib
+import json
 import os
+import shutil
+import time
 
+import library.files
 import library.md5sum
 
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, Optional, Set, Tuple
 
 import logging
 log = logging.getLogger(__name__)
 
 
+JOURNAL_NAME = '.moves.jsonl'
+
+
 @dataclass
 class BrokenFile:
     old_src: str
     new_src: str
     dst: str
-    old_md5: str
-    new_md5: str
+    old_md5: Optional[str] = None
+    new_md5: Optional[str] = None
 
 
 class FileMover:
@@ -27,42 +34,81 @@ class FileMover:
         self._dst_to_src = dict()
         self._remove_list = []
         self._broken_files = []
+        self._collisions = []  # (old_src, src, dst), resolved in bulk
+        self._same_as = dict()  # removed src -> dst with the same content
+        self._dir_names = dict()
+
+    def _get_dir_names(self, dirname: str) -> Tuple[Set[str], Set[str]]:
+        # each dst dir is listed once, lowercase names catch case-insensitive filesystems
+        if dirname not in self._dir_names:
+            try:
+                names = set(os.listdir(dirname or '.'))
+            except FileNotFoundError:
+                names = set()
+            self._dir_names[dirname] = names, {name.lower() for name in names}
+        return self._dir_names[dirname]
+
+    def _dst_exists(self, dst: str) -> bool:
+        dirname, basename = os.path.split(dst)
+        names, lower_names = self._get_dir_names(dirname)
+        if basename in names:
+            return True
+        if basename.lower() in lower_names:
+            return os.path.exists(dst)
+        return False
 
     def add(self, src: str, dst: str):
         if src == dst:
             log.debug(f'Same location, skip: {src!r}')
             return
 
-        if os.path.exists(dst):
+        if self._dst_exists(dst):
             raise RuntimeError(f'Dst already exists: {dst!r}')
 
         if src in self._src_to_dst:
             raise RuntimeError(f'Trying to move src again: {src!r}')
 
         if dst in self._dst_to_src:
-            broken_file = BrokenFile(
-                old_src=self._dst_to_src[dst],
-                new_src=src,
-                dst=dst,
-                old_md5=library.md5sum.md5sum(self._dst_to_src[dst]),
-                new_md5=library.md5sum.md5sum(src),
-            )
-            if broken_file.old_md5 == broken_file.new_md5:
+            self._collisions.append((self._dst_to_src[dst], src, dst))
+            return
+
+        self._move_list.append((src, dst))
+        self._src_to_dst[src] = dst
+        self._dst_to_src[dst] = src
+
+    def _resolve_collisions(self):
+        # sizes first, md5 only for files of the same size
+        collisions, self._collisions = self._collisions, []
+        if not collisions:
+            return
+
+        same_size = []
+        for old_src, src, dst in collisions:
+            if os.path.getsize(old_src) == os.path.getsize(src):
+                same_size.append((old_src, src, dst))
+            else:
+                self._broken_files.append(BrokenFile(old_src=old_src, new_src=src, dst=dst))
+
+        filenames = sorted({filename for old_src, src, _ in same_size for filename in [old_src, src]})
+        md5sums = dict(library.md5sum.md5sum_many(filenames))
+        for old_src, src, dst in same_size:
+            if md5sums[old_src] == md5sums[src]:
                 log.debug(
                     f'Same dst location for files, will drop {src}:'
-                    f'\n\told src:\t{broken_file.old_src}'
-                    f'\n\tnew src:\t{broken_file.new_src}'
-                    f'\n\tdst:\t\t{broken_file.dst}'
-                    f'\n\tmd5sum:\t{broken_file.old_md5}'
+                    f'\n\told src:\t{old_src}'
+                    f'\n\tnew src:\t{src}'
+                    f'\n\tdst:\t\t{dst}'
                 )
                 self._remove_list.append(src)
-                return
+                self._same_as[src] = dst
             else:
-                self._broken_files.append(broken_file)
-
-        self._move_list.append((src, dst))
-        self._src_to_dst[src] = dst
-        self._dst_to_src[dst] = src
+                self._broken_files.append(BrokenFile(
+                    old_src=old_src,
+                    new_src=src,
+                    dst=dst,
+                    old_md5=md5sums[old_src],
+                    new_md5=md5sums[src],
+                ))
 
     @property
     def has_dst_files(self):
@@ -86,7 +132,20 @@ class FileMover:
                 log.info(f'rm {filename!r}')
             yield filename
 
+    def _fill_md5sums(self):
+        broken_files = [broken_file for broken_file in self._broken_files if broken_file.old_md5 is None]
+        if not broken_files:
+            return
+
+        filenames = [filename for broken_file in broken_files for filename in [broken_file.old_src, broken_file.new_src]]
+        md5sums = [md5sum for _, md5sum in library.md5sum.md5sum_many(filenames)]
+        for broken_file, old_md5, new_md5 in zip(broken_files, md5sums[::2], md5sums[1::2]):
+            broken_file.old_md5 = old_md5
+            broken_file.new_md5 = new_md5
+
     def _validate(self):
+        self._resolve_collisions()
+        self._fill_md5sums()
         for broken_file in self._broken_files:
             log.error(
                 f'Broken file:'
@@ -106,6 +165,53 @@ class FileMover:
         if self._broken_files:
             raise RuntimeError(f'Has {len(self._broken_files)} broken files, resolve manually')
 
+    def save_plan(self, filename: str, source_dir: str):
+        plan = {
+            'source_dir': os.path.abspath(source_dir),
+            'planned_at': time.time(),
+            'move': [{'src': src, 'dst': dst} for src, dst in self.get_mv_files()],
+            'remove': [{'src': src, 'same_as': self._same_as.get(src)} for src in self.get_rm_files()],
+        }
+        library.files.save_json(filename, plan)
+        log.info(f'Saved plan to {filename!r}: {len(plan["move"])} files to move, {len(plan["remove"])} files to remove')
+
+    @classmethod
+    def load_plan(cls, filename: str, source_dir: str):
+        with open(filename) as f:
+            plan = json.load(f)
+
+        if plan.get('source_dir') != os.path.abspath(source_dir):
+            raise RuntimeError(f'Plan {filename!r} was made for {plan.get("source_dir")!r}, not for {source_dir!r}')
+
+        def check_src(src: str):
+            if not os.path.exists(src):
+                raise RuntimeError(f'Src is missing, plan is outdated: {src!r}')
+            if os.path.getmtime(src) > plan['planned_at']:
+                raise RuntimeError(f'Src was changed after planning, plan is outdated: {src!r}')
+
+        file_mover = cls()
+        for row in plan['move']:
+            check_src(row['src'])
+            file_mover.add(row['src'], row['dst'])
+        for row in plan['remove']:
+            check_src(row['src'])
+            file_mover._remove_list.append(row['src'])
+            if row['same_as']:
+                file_mover._same_as[row['src']] = row['same_as']
+
+        log.info(f'Loaded plan from {filename!r}')
+        return file_mover
+
+    def execute(self, journal_file: str):
+        operations = [
+            {'op': 'mkdir', 'path': dirname}
+            for dirname in sorted({os.path.dirname(dst) for _, dst in self.get_mv_files()})
+            if not os.path.isdir(dirname)
+        ]
+        operations += [{'op': 'mv', 'src': src, 'dst': dst} for src, dst in self.get_mv_files(with_log=True)]
+        operations += [{'op': 'rm', 'path': src, 'same_as': self._same_as.get(src)} for src in self.get_rm_files(with_log=True)]
+        MoveJournal.create(journal_file, operations).replay()
+
     def get_src_dirnames(self) -> Dict[str, List[str]]:
         dirnames = collections.defaultdict(list)
         for src, _ in self.get_mv_files():
@@ -125,3 +231,143 @@ class FileMover:
             log.info(f'Dst dir {dirname!r} with {len(files)} files: [ {os.path.basename(files[0])!r} .. {os.path.basename(files[-1])!r} ]')
 
         return dict(dirnames)
+
+
+class MoveJournal:
+    # Append-only jsonl: planned operations, then indices of applied and reverted ones.
+    # Operations are checked against the filesystem before applying, so a lost record only means a recheck.
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.operations = []
+        self.planned = False
+        self.done = set()
+        self.undone = set()
+        with open(filename) as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    log.warning(f'Skipping torn record in {filename!r}: {line!r}')
+                    break
+                row = json.loads(line)
+                if 'op' in row:
+                    self.operations.append(row)
+                elif 'planned' in row:
+                    self.planned = row['planned'] == len(self.operations)
+                elif 'done' in row:
+                    self.done.add(row['done'])
+                elif 'undone' in row:
+                    self.undone.add(row['undone'])
+
+    @classmethod
+    def create(cls, filename: str, operations: List[dict]):
+        if os.path.exists(filename):
+            raise RuntimeError(f'Journal already exists, replay or roll it back first: {filename!r}')
+
+        with open(filename, 'w') as f:
+            for operation in operations:
+                f.write(json.dumps(operation, ensure_ascii=False) + '\n')
+            f.write(json.dumps({'planned': len(operations)}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        log.info(f'Saved {len(operations)} operations to {filename!r}')
+        return cls(filename)
+
+    def _append(self, f, row: dict):
+        f.write(json.dumps(row) + '\n')
+        f.flush()
+
+    def _apply(self, operation: dict):
+        op = operation['op']
+        if op == 'mkdir':
+            if not os.path.isdir(operation['path']):
+                os.mkdir(operation['path'])
+        elif op == 'mv':
+            src, dst = operation['src'], operation['dst']
+            if os.path.exists(src):
+                if os.path.exists(dst):
+                    raise RuntimeError(f'Dst already exists: {dst!r}')
+                os.rename(src, dst)
+            elif not os.path.exists(dst):
+                raise RuntimeError(f'Both src and dst are missing: {src!r}, {dst!r}')
+        elif op == 'rm':
+            if os.path.exists(operation['path']):
+                os.remove(operation['path'])
+        elif op == 'link':
+            path, target = operation['path'], operation['target']
+            if not os.path.samefile(path, target):
+                stat = os.stat(path)
+                if [stat.st_size, stat.st_mtime_ns] != [operation['size'], operation['mtime_ns']]:
+                    raise RuntimeError(f'File was changed after planning: {path!r}')
+                target_stat = os.stat(target)
+                if [target_stat.st_size, target_stat.st_mtime_ns] != [operation['target_size'], operation['target_mtime_ns']]:
+                    raise RuntimeError(f'Link target was changed after planning: {target!r}')
+                tmp_path = f'{path}.link'
+                if os.path.lexists(tmp_path):
+                    os.remove(tmp_path)  # left by interrupted replay
+                os.link(target, tmp_path)
+                os.replace(tmp_path, path)
+        else:
+            raise RuntimeError(f'Unknown operation: {operation}')
+
+    def _revert(self, operation: dict):
+        op = operation['op']
+        if op == 'rm':
+            path, same_as = operation['path'], operation.get('same_as')
+            if not os.path.exists(path):
+                if not same_as:
+                    raise RuntimeError(f'Could not restore {path!r}: no file with the same content')
+                shutil.copy2(same_as, path)
+        elif op == 'mv':
+            src, dst = operation['src'], operation['dst']
+            if os.path.exists(dst) and not os.path.exists(src):
+                os.rename(dst, src)
+        elif op == 'link':
+            # own copy of the same content, with original mode and mtime
+            path, target = operation['path'], operation['target']
+            if os.path.samefile(path, target):
+                tmp_path = f'{path}.unlink'
+                shutil.copyfile(target, tmp_path)
+                os.chmod(tmp_path, operation['mode'])
+                os.utime(tmp_path, ns=(operation['mtime_ns'], operation['mtime_ns']))
+                os.replace(tmp_path, path)
+        elif op == 'mkdir':
+            path = operation['path']
+            if os.path.isdir(path):
+                if os.listdir(path):
+                    log.warning(f'Dir is not empty, keeping it: {path!r}')
+                else:
+                    os.rmdir(path)
+        else:
+            raise RuntimeError(f'Unknown operation: {operation}')
+
+    def replay(self, keep: bool = False):
+        # keep: leave finished journal to roll it back later
+        if not self.planned:
+            log.warning(f'Plan in {self.filename!r} is incomplete, nothing was applied')
+        elif self.undone:
+            raise RuntimeError(f'Journal {self.filename!r} was partially rolled back, finish the rollback')
+        else:
+            pending = [index for index in range(len(self.operations)) if index not in self.done]
+            log.info(f'Applying {len(pending)} of {len(self.operations)} operations from {self.filename!r}')
+            with open(self.filename, 'a') as f:
+                for index in pending:
+                    self._apply(self.operations[index])
+                    self._append(f, {'done': index})
+                    self.done.add(index)
+        if keep:
+            log.info(f'Applied all operations, journal is kept in {self.filename!r}')
+        else:
+            os.remove(self.filename)
+
+    def rollback(self):
+        if self.planned:
+            pending = [index for index in reversed(range(len(self.operations))) if index not in self.undone]
+            log.info(f'Reverting {len(pending)} of {len(self.operations)} operations from {self.filename!r}')
+            with open(self.filename, 'a') as f:
+                for index in pending:
+                    self._revert(self.operations[index])
+                    self._append(f, {'undone': index})
+                    self.undone.add(index)
+        else:
+            log.warning(f'Plan in {self.filename!r} is incomplete, nothing was applied')
+        os.remove(self.filename)
@@ -0,0 +1,108 @@
+import contextlib
+import json
+import os
+import sqlite3
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+import logging
+log = logging.getLogger(__name__)
+
+
+CREATE_TABLE = '''
+CREATE TABLE IF NOT EXISTS photos (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    data TEXT NOT NULL
+)
+'''
+
+
+@dataclass
+class CatalogEntry:
+    path: str
+    size: int
+    mtime_ns: int
+    values: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_path(cls, path: str):
+        stat = os.stat(path)
+        return cls(path=path, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+
+class PhotoCatalog:
+    COMMIT_EVERY = 1000
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._connection = sqlite3.connect(filename)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(CREATE_TABLE)
+        self._pending = 0
+        self.hits = 0
+        self.misses = 0
+        log.info(f'Using photo catalog {filename!r}')
+
+    def _load_values(self, entry: CatalogEntry) -> Optional[Dict[str, Any]]:
+        row = self._connection.execute(
+            'SELECT size, mtime_ns, data FROM photos WHERE path = ?',
+            (entry.path,),
+        ).fetchone()
+        if row and row[0] == entry.size and row[1] == entry.mtime_ns:
+            return json.loads(row[2])
+        return None
+
+    def lookup(self, path: str) -> CatalogEntry:
+        entry = CatalogEntry.from_path(path)
+        self.fill(entry)
+        return entry
+
+    def fill(self, entry: CatalogEntry):
+        # entry stat'ed elsewhere, e.g. in a worker thread
+        values = self._load_values(entry)
+        if values is not None:
+            entry.values = values
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def save(self, entry: CatalogEntry):
+        self._connection.execute(
+            'INSERT OR REPLACE INTO photos (path, size, mtime_ns, data) VALUES (?, ?, ?, ?)',
+            (entry.path, entry.size, entry.mtime_ns, json.dumps(entry.values, sort_keys=True, ensure_ascii=False)),
+        )
+        self._pending += 1
+        if self._pending >= self.COMMIT_EVERY:
+            self.commit()
+
+    def merge(self, entry: CatalogEntry):
+        # entry computed elsewhere, e.g. in a worker process: keep values cached before
+        values = self._load_values(entry)
+        if values:
+            values.update(entry.values)
+            entry.values = values
+        self.save(entry)
+
+    def commit(self):
+        self._connection.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._connection.close()
+        log.info(f'Photo catalog {self.filename!r}: {self.hits} hits, {self.misses} misses')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_catalog(filename: Optional[str]):
+    if filename:
+        return PhotoCatalog(filename)
+    return contextlib.nullcontext()
@@ -0,0 +1,127 @@
+import io
+import struct
+
+from typing import Optional, Tuple
+
+import PIL
+import PIL.Image
+import PIL.TiffImagePlugin
+
+import logging
+log = logging.getLogger(__name__)
+
+
+MAX_HEADER_BYTES = 2 * 1024 * 1024
+MAX_JPEG_SEGMENTS = 64
+
+JPEG_PREFIX = b'\xff\xd8'
+PNG_PREFIX = b'\x89PNG\r\n\x1a\n'
+TIFF_PREFIXES = {b'II*\x00', b'MM\x00*'}
+EXIF_PREFIX = b'Exif\x00\x00'
+
+APP1_MARKER = 0xE1
+SOS_MARKER = 0xDA
+EOI_MARKER = 0xD9
+STANDALONE_MARKERS = {0x01} | set(range(0xD0, 0xD8))
+
+
+class ExifReaderError(ValueError):
+    pass
+
+
+class CountingReader(io.RawIOBase):
+    def __init__(self, raw, limit: Optional[int] = None):
+        self._raw = raw
+        self.limit = limit
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._raw.seek(offset, whence)
+
+    def tell(self):
+        return self._raw.tell()
+
+    def readinto(self, buffer):
+        count = self._raw.readinto(buffer)
+        self.bytes_read += count or 0
+        if self.limit is not None and self.bytes_read > self.limit:
+            raise ExifReaderError(f'Read more than {self.limit} bytes of headers')
+        return count
+
+
+def _read_exact(f, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise ExifReaderError(f'Unexpected end of file: got {len(data)} of {size} bytes')
+    return data
+
+
+def _find_jpeg_exif(f) -> Optional[bytes]:
+    for _ in range(MAX_JPEG_SEGMENTS):
+        prefix, marker = _read_exact(f, 2)
+        while marker == 0xFF:  # fill bytes
+            marker = _read_exact(f, 1)[0]
+        if prefix != 0xFF:
+            raise ExifReaderError(f'Invalid JPEG marker {prefix:#x} {marker:#x}')
+
+        if marker in STANDALONE_MARKERS:
+            continue
+        if marker in (SOS_MARKER, EOI_MARKER):
+            return None
+
+        size = struct.unpack('>H', _read_exact(f, 2))[0] - 2
+        if marker == APP1_MARKER and size >= len(EXIF_PREFIX):
+            segment = _read_exact(f, size)
+            if segment.startswith(EXIF_PREFIX):
+                return segment
+        else:
+            f.seek(size, io.SEEK_CUR)
+
+    raise ExifReaderError(f'No image data in first {MAX_JPEG_SEGMENTS} segments')
+
+
+def _read_jpeg_tags(f) -> Optional[dict]:
+    segment = _find_jpeg_exif(f)
+    if segment is None:
+        return None
+
+    exif = PIL.Image.Exif()
+    exif.load(segment)
+    return exif._get_merged_dict()
+
+
+def _read_tiff_tags(f, header: bytes) -> dict:
+    tag_v2 = PIL.TiffImagePlugin.ImageFileDirectory_v2(header)
+    f.seek(tag_v2.next)
+    tag_v2.load(f)
+    return PIL.TiffImagePlugin.ImageFileDirectory_v1.from_v2(tag_v2)
+
+
+def read_tags(f: CountingReader, name: str) -> Tuple[str, Optional[dict]]:
+    # Returns raw tags as PIL.Image.open would: merged JPEG EXIF or the first TIFF IFD.
+    try:
+        header = f.read(8)
+        if header.startswith(JPEG_PREFIX):
+            f.seek(len(JPEG_PREFIX))
+            return 'JPEG', _read_jpeg_tags(f)
+        elif header.startswith(PNG_PREFIX):
+            return 'PNG', None
+        elif header[:4] in TIFF_PREFIXES:
+            return 'TIFF', _read_tiff_tags(f, header)
+    except (OSError, SyntaxError, struct.error) as e:
+        raise ExifReaderError(f'Could not read headers of {name!r}: {e}') from e
+    finally:
+        log.debug(f'Read {f.bytes_read} header bytes from {name!r}')
+
+    raise ExifReaderError(f'Unsupported format of {name!r}: {header!r}')
+
+
+def read_exif_tags(filename: str, limit: int = MAX_HEADER_BYTES) -> Tuple[str, Optional[dict]]:
+    with open(filename, 'rb', buffering=0) as raw:
+        return read_tags(CountingReader(raw, limit=limit), filename)
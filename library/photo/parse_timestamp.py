@@ -1,58 +1,98 @@
 import re
 import datetime
-import pytz
-from typing import Optional
+import functools
+from typing import Iterable, List, Optional
 
 import logging
 log = logging.getLogger(__name__)
 
 
 TIMESTAMP_RE = (
-    r'('
     r'20\d{2}'
-    r'([-_\.:])?'
+    r'[-_\.:]?'
     r'\d{2}'
-    r'([-_\.:])?'
+    r'[-_\.:]?'
     r'\d{2}'
-    r'([-_\.: ])?'
+    r'[-_\.: ]?'
     r'\d{2}'
-    r'([-_\.:])?'
+    r'[-_\.:]?'
     r'\d{2}'
-    r'([-_\.:])?'
+    r'[-_\.:]?'
     r'\d{2}'
-    r')'
 )
 
+# in order of priority
 TS_PREFIXES = [
-    fr'^{TIMESTAMP_RE}[-_\.~ ]',
-    fr'[a-zA-Z-_]{TIMESTAMP_RE}[-_\.~ ]',
-    fr'^{TIMESTAMP_RE}\b',
-    fr'[a-zA-Z-_]{TIMESTAMP_RE}\b',
+    fr'^(?P<ts0>{TIMESTAMP_RE})[-_\.~ ]',
+    fr'[a-zA-Z-_](?P<ts1>{TIMESTAMP_RE})[-_\.~ ]',
+    fr'^(?P<ts2>{TIMESTAMP_RE})\b',
+    fr'[a-zA-Z-_](?P<ts3>{TIMESTAMP_RE})\b',
 ]
+TS_GROUPS = ['ts0', 'ts1', 'ts2', 'ts3']
+
+# Leftmost match of the alternation. Prefixes 0 and 2 are anchored and prefix 1 wins ties with 3,
+# so only a match of prefix 2 or 3 could be overridden by a later match of prefix 1.
+TS_ANY_PREFIX_RE = re.compile('|'.join(TS_PREFIXES))
+TS_SECOND_PREFIX_RE = re.compile(TS_PREFIXES[1])
+MAYBE_DT_RE = re.compile(r'.*\d{4}.?\d{2}.?\d{2}.*\d{2}.?\d{2}.?\d{2}.*')
+NOT_DIGITS_RE = re.compile(r'\D')
 
 MIN_OK_TIMESTAMP = 1100000000
 MAX_OK_TIMESTAMP = 2000000000
 SKIP_TIMESTAMP = 100000000
 
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+@functools.lru_cache(maxsize=2 ** 16)
+def _local_offset(year: int, month: int, day: int) -> Optional[int]:
+    # Seconds to subtract from naive local time to get a timestamp, None if offset changes within the day.
+    naive = (datetime.date(year, month, day).toordinal() - EPOCH_ORDINAL) * 86400
+    start_offset = naive - int(datetime.datetime(year, month, day).timestamp())
+    end_offset = naive + 86399 - int(datetime.datetime(year, month, day, 23, 59, 59).timestamp())
+    return start_offset if start_offset == end_offset else None
+
+
+def _to_timestamp(digits: str) -> int:
+    year, month, day = int(digits[0:4]), int(digits[4:6]), int(digits[6:8])
+    hour, minute, second = int(digits[8:10]), int(digits[10:12]), int(digits[12:14])
+    dt = datetime.datetime(year, month, day, hour, minute, second)  # validates values
+    offset = _local_offset(year, month, day)
+    if offset is None:
+        return int(dt.timestamp())
+    return (dt.toordinal() - EPOCH_ORDINAL) * 86400 + hour * 3600 + minute * 60 + second - offset
+
+
+def _find_timestamp(basename: str) -> Optional[str]:
+    match = TS_ANY_PREFIX_RE.search(basename)
+    if match is None:
+        return None
+
+    group = match.lastgroup
+    if group in ('ts2', 'ts3'):
+        second_match = TS_SECOND_PREFIX_RE.search(basename)
+        if second_match:
+            return second_match.group('ts1')
+    return match.group(group)
+
 
 def parse_timestamp(basename: str) -> Optional[int]:
-    for ts_re in TS_PREFIXES:
-        res = re.search(ts_re, basename)
-        if res:
-            res = ''.join([l for l in res.group(1) if l.isdigit()])
-            dt = datetime.datetime.strptime(res, '%Y%m%d%H%M%S')
-            moscow_tz = pytz.timezone('Europe/Moscow')
-            dt = moscow_tz.localize(dt).replace(tzinfo=None)
-            timestamp = int(dt.timestamp())
-            if MIN_OK_TIMESTAMP < timestamp < MAX_OK_TIMESTAMP:
-                return timestamp
-            elif timestamp < SKIP_TIMESTAMP:
-                log.warn(f'Timestamp {timestamp} is too old, skippping')
-                return None
-            else:
-                raise RuntimeError(f'Invalid timestamp {timestamp} from {basename!r}')
-
-    if re.match(r'.*\d{4}.?\d{2}.?\d{2}.*\d{2}.?\d{2}.?\d{2}.*', basename):
+    value = _find_timestamp(basename)
+    if value is not None:
+        timestamp = _to_timestamp(NOT_DIGITS_RE.sub('', value))
+        if MIN_OK_TIMESTAMP < timestamp < MAX_OK_TIMESTAMP:
+            return timestamp
+        elif timestamp < SKIP_TIMESTAMP:
+            log.warn(f'Timestamp {timestamp} is too old, skippping')
+            return None
+        else:
+            raise RuntimeError(f'Invalid timestamp {timestamp} from {basename!r}')
+
+    if MAYBE_DT_RE.match(basename):
         log.info(f'No dt in {basename}')
 
     return None
+
+
+def parse_timestamps(basenames: Iterable[str]) -> List[Optional[int]]:
+    return [parse_timestamp(basename) for basename in basenames]
@@ -0,0 +1,100 @@
+import math
+
+from typing import Generic, List, Optional, Tuple, TypeVar
+
+import numpy
+
+import PIL
+import PIL.Image
+import PIL.ImageOps
+
+import logging
+log = logging.getLogger(__name__)
+
+
+HASH_SIZE = 8
+IMAGE_SIZE = 32
+DRAFT_SIZE = 4 * IMAGE_SIZE
+
+
+def _dct_matrix(size: int) -> numpy.ndarray:
+    # orthonormal DCT-II: dct(x) = M @ x
+    k = numpy.arange(size).reshape(-1, 1)
+    n = numpy.arange(size).reshape(1, -1)
+    matrix = numpy.cos(math.pi * (2 * n + 1) * k / (2 * size)) * math.sqrt(2 / size)
+    matrix[0] /= math.sqrt(2)
+    return matrix
+
+
+DCT_MATRIX = _dct_matrix(IMAGE_SIZE)
+
+
+def perceptual_hash(filename: str) -> int:
+    with PIL.Image.open(filename) as image:
+        # JPEG decoder downscales by 1/2..1/8 in DCT domain, so full image is never decoded
+        image.draft('L', (DRAFT_SIZE, DRAFT_SIZE))
+        image = PIL.ImageOps.exif_transpose(image)
+        image = image.convert('L').resize((IMAGE_SIZE, IMAGE_SIZE), PIL.Image.Resampling.LANCZOS)
+
+    pixels = numpy.asarray(image, dtype=numpy.float64)
+    dct = DCT_MATRIX @ pixels @ DCT_MATRIX.T
+    low_frequencies = dct[:HASH_SIZE, :HASH_SIZE].flatten()
+    bits = low_frequencies > numpy.median(low_frequencies[1:])
+
+    result = 0
+    for bit in bits:
+        result = (result << 1) | int(bit)
+    return result
+
+
+def hamming_distance(first: int, second: int) -> int:
+    return (first ^ second).bit_count()
+
+
+T = TypeVar('T')
+
+
+class BKTree(Generic[T]):
+    # Metric tree over Hamming distance: search visits only children within max_distance of the query
+    def __init__(self):
+        self._root: Optional[list] = None
+        self.size = 0
+
+    def add(self, value: int, item: T):
+        self.size += 1
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+
+        node = self._root
+        while True:
+            node_value, items, children = node
+            distance = hamming_distance(value, node_value)
+            if distance == 0:
+                items.append(item)
+                return
+
+            child = children.get(distance)
+            if child is None:
+                children[distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, T]]:
+        result = []
+        if self._root is None:
+            return result
+
+        candidates = [self._root]
+        while candidates:
+            node_value, items, children = candidates.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= max_distance:
+                result.extend((distance, item) for item in items)
+
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    candidates.append(child)
+
+        result.sort(key=lambda pair: pair[0])
+        return result
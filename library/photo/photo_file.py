@@ -1,6 +1,7 @@
-from typing import List, Optional, Tuple
+from typing import Collection, List, Optional, Tuple
 from functools import cached_property
 
+import concurrent.futures
 import datetime
 import os
 import re
@@ -13,7 +14,10 @@ import PIL.ExifTags
 import PIL.TiffTags
 
 import library.md5sum
+from library.photo.catalog import CatalogEntry, PhotoCatalog
+from library.photo.exif_reader import ExifReaderError, read_exif_tags
 from library.photo.parse_timestamp import parse_timestamp
+from library.photo.phash import perceptual_hash
 
 import logging
 log = logging.getLogger(__name__)
@@ -27,6 +31,11 @@ KNOWN_KEYS = {
     'ExposureTime', 'CompositeImageExposureTimes',
 }
 
+CATALOG_EXIF_KEYS = KNOWN_KEYS | {'Make', 'Model', 'Software'}
+
+# threads mostly wait for network mounts, not for cpu
+PREFETCH_WORKERS = 16
+
 
 @attr.s
 class PhotoInfo:
@@ -77,6 +86,21 @@ def parse_jpg_exif(data: dict) -> dict:
     return result
 
 def get_exif(filename: str) -> Optional[dict]:
+    try:
+        image_format, tags = read_exif_tags(filename)
+    except ExifReaderError as e:
+        log.debug(f'Falling back to Pillow: {e}')
+        return get_pillow_exif(filename)
+
+    if tags is None:
+        return None
+    elif image_format == 'TIFF':
+        return parse_tiff_exif(tags)
+    else:
+        return parse_jpg_exif(tags)
+
+
+def get_pillow_exif(filename) -> Optional[dict]:
     with PIL.Image.open(filename) as image:
         if image.format == 'TIFF':
             return parse_tiff_exif(image.tag)
@@ -95,8 +119,16 @@ class PhotoFileAdapter(logging.LoggerAdapter):
 
 
 class PhotoFile:
-    def __init__(self, filename):
+    def __init__(
+        self,
+        filename,
+        catalog: Optional[PhotoCatalog] = None,
+        entry: Optional[CatalogEntry] = None,
+    ):
         self.Path = filename
+        self.catalog = catalog
+        self._entry = entry
+        self._md5sum: Optional[str] = None
         short_name = self.Path.removeprefix(library.files.Location.YandexDisk).lstrip(os.sep)
         self.log = PhotoFileAdapter(logging.getLogger(__name__), {'filename': short_name})
 
@@ -108,6 +140,28 @@ class PhotoFile:
             timestamps=[self.timestamp],
         )
 
+    @cached_property
+    def CatalogEntry(self) -> CatalogEntry:
+        if self._entry is not None:
+            return self._entry
+        if self.catalog is not None:
+            return self.catalog.lookup(self.Path)
+        return CatalogEntry.from_path(self.Path)
+
+    def _read_through(self, key: str, compute, dump=None, load=None):
+        values = self.CatalogEntry.values
+        if key in values:
+            value = values[key]
+            if load and value is not None:
+                value = load(value)
+            return value
+
+        value = compute()
+        values[key] = dump(value) if (dump and value is not None) else value
+        if self.catalog is not None:
+            self.catalog.save(self.CatalogEntry)
+        return value
+
     @cached_property
     def Basename(self):
         return os.path.basename(self.Path)
@@ -119,6 +173,12 @@ class PhotoFile:
     @cached_property
     def Exif(self) -> Optional[dict]:
         exif = get_exif(self.Path)
+        if exif and 'exif' not in self.CatalogEntry.values:
+            self.CatalogEntry.values['exif'] = {
+                key: value
+                for key, value in exif.items()
+                if key in CATALOG_EXIF_KEYS and isinstance(value, str)
+            }
         # if exif:
         #     msg = ['Exif: ']
         #     for key, value in sorted(exif.items()):
@@ -137,7 +197,10 @@ class PhotoFile:
         return None
 
     @cached_property
-    def Camera(self):
+    def Camera(self) -> Optional[str]:
+        return self._read_through('camera', self._get_camera)
+
+    def _get_camera(self) -> Optional[str]:
         if self.Exif:
             make = self.Exif.get('Make')
             model = self.Exif.get('Model')
@@ -160,8 +223,7 @@ class PhotoFile:
         log.debug(f'Name {self.Basename!r} has no date')
         return None
 
-    @cached_property
-    def datetime(self) -> Optional[datetime.datetime]:
+    def _get_datetime(self) -> Optional[datetime.datetime]:
         try:
             if self.Exif:
                 datetime_exif = {
@@ -211,14 +273,29 @@ class PhotoFile:
 
         return None
 
+    @cached_property
+    def datetime(self) -> Optional[datetime.datetime]:
+        return self._read_through(
+            'datetime',
+            self._get_datetime,
+            dump=datetime.datetime.isoformat,
+            load=datetime.datetime.fromisoformat,
+        )
+
     @cached_property
     def timestamp(self) -> Optional[int]:
+        return self._read_through('timestamp', self._get_timestamp)
+
+    def _get_timestamp(self) -> Optional[int]:
         if self.datetime:
             return int(self.datetime.timestamp())
         return None
 
     @cached_property
-    def is_vsco(self):
+    def is_vsco(self) -> bool:
+        return self._read_through('is_vsco', self._get_is_vsco)
+
+    def _get_is_vsco(self) -> bool:
         if self.Exif:
             for value in self.Exif.values():
                 if isinstance(value, str) and 'vsco' in value.lower():
@@ -228,8 +305,64 @@ class PhotoFile:
 
     @cached_property
     def Md5Sum(self) -> str:
+        return self._read_through('md5sum', self._get_md5sum)
+
+    def set_md5sum(self, md5sum: str):
+        # computed in bulk, e.g. by library.md5sum.md5sum_many: used instead of reading the file
+        self._md5sum = md5sum
+
+    def _get_md5sum(self) -> str:
+        if self._md5sum is not None:
+            return self._md5sum
         return library.md5sum.md5sum(self.Path)
 
+    @cached_property
+    def PerceptualHash(self) -> Optional[int]:
+        return self._read_through('phash', self._get_perceptual_hash)
+
+    def _get_perceptual_hash(self) -> Optional[int]:
+        try:
+            return perceptual_hash(self.Path)
+        except (OSError, ValueError) as e:
+            self.log.warn(f'Could not get perceptual hash: {e}')
+            return None
+
+
+def _prefetch(photo_file: PhotoFile, attribute: str) -> PhotoFile:
+    getattr(photo_file, attribute)
+    return photo_file
+
+
+def prefetch_photo_files(
+    filenames: List[str],
+    *,
+    attribute: str,
+    catalog: Optional[PhotoCatalog] = None,
+    workers: int = PREFETCH_WORKERS,
+    extensions: Optional[Collection[str]] = None,
+) -> List[PhotoFile]:
+    # Stat all files and compute attribute (named as its catalog key) in threads.
+    # Sqlite catalog stays in the calling thread: workers get PhotoFiles without catalog.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        photo_files = []
+        for entry in executor.map(CatalogEntry.from_path, filenames):
+            if catalog is not None:
+                catalog.fill(entry)
+            photo_files.append(PhotoFile(entry.path, entry=entry))
+
+        missing = [
+            photo_file
+            for photo_file in photo_files
+            if attribute not in photo_file.CatalogEntry.values
+            and (extensions is None or photo_file.extension.lower() in extensions)
+        ]
+        log.info(f'Reading {attribute} of {len(missing)} of {len(photo_files)} files with {workers} threads')
+        for photo_file in executor.map(_prefetch, missing, [attribute] * len(missing)):
+            if catalog is not None:
+                catalog.save(photo_file.CatalogEntry)
+
+    return photo_files
+
 
 def get_microsecond(subsec: str) -> int:
     if subsec is not None:
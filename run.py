@@ -13,11 +13,14 @@ import tools.running.process.sync
 import tools.running.process.join
 import tools.running.process.analyze
 import tools.photo.deduplicate
+import tools.photo.dedupe_link
 import tools.photo.calculate
 import tools.photo.compare
 import tools.photo.parse
 import tools.photo.renamer
 import tools.photo.airdrop
+import tools.photo.journal
+import tools.photo.similar
 
 import logging
 log = logging.getLogger('treashure')
@@ -28,12 +31,16 @@ COMMANDS = [
     ('track-join', 'Join old tracks into one', tools.running.process.join.populate_parser),
     ('track-analyze', 'Analyze track files', tools.running.process.analyze.populate_parser),
     ('photo-deduplicate', 'Deduplicate mobile photos', tools.photo.deduplicate.populate_parser),
+    ('photo-dedupe-link', 'Replace duplicate photos with hardlinks', tools.photo.dedupe_link.populate_parser),
     ('photo-calculate', 'Calculate photos stats', tools.photo.calculate.populate_parser),
     ('photo-calc', 'Run calc', tools.photo.compare.populate_calc_parser),
     ('photo-compare', 'Run compare', tools.photo.compare.populate_compare_parser),
+    ('photo-hashes-convert', 'Convert hashes file between json and binary formats', tools.photo.compare.populate_convert_parser),
+    ('photo-similar', 'Find similar photos by perceptual hash', tools.photo.similar.populate_parser),
     ('flickr-parse', 'Prepare photos', tools.photo.parse.populate_parser),
     ('photo-rename', 'Rename vsco photos', tools.photo.renamer.populate_parser),
     ('airdrop-move', 'Move airdrop photos to one dir', tools.photo.airdrop.populate_parser),
+    ('photo-moves-journal', 'Replay or roll back moves and links', tools.photo.journal.populate_parser),
     ('sluchaem', 'Print sluchaem data', tools.charity.sluchaem.populate_parser),
     ('donations', 'Print donations data', tools.charity.donations.populate_parser),
     ('video-stats', 'Save videos stats', tools.youtube.monitor.populate_parser),
@@ -0,0 +1,38 @@
+import os
+
+import library.md5sum
+from library.photo.catalog import PhotoCatalog
+from library.photo.photo_file import PhotoFile
+
+
+def test_catalog_read_through(tmp_path, monkeypatch):
+    filename = str(tmp_path / 'photo.jpg')
+    with open(filename, 'wb') as f:
+        f.write(b'not a real photo')
+
+    catalog_file = str(tmp_path / 'catalog.sqlite')
+    with PhotoCatalog(catalog_file) as catalog:
+        md5sum = PhotoFile(filename, catalog=catalog).Md5Sum
+        assert catalog.misses == 1
+
+    def fail(filename):
+        raise AssertionError(f'{filename} must not be read')
+
+    monkeypatch.setattr(library.md5sum, 'md5sum', fail)
+    with PhotoCatalog(catalog_file) as catalog:
+        assert PhotoFile(filename, catalog=catalog).Md5Sum == md5sum
+        assert catalog.hits == 1
+
+
+def test_catalog_detects_changes(tmp_path):
+    filename = str(tmp_path / 'photo.jpg')
+    with open(filename, 'wb') as f:
+        f.write(b'first')
+
+    with PhotoCatalog(str(tmp_path / 'catalog.sqlite')) as catalog:
+        entry = catalog.lookup(filename)
+        entry.values['md5sum'] = 'first'
+        catalog.save(entry)
+
+        os.utime(filename, ns=(0, entry.mtime_ns + 10 ** 9))
+        assert catalog.lookup(filename).values == {}
@@ -0,0 +1,51 @@
+import pytest
+
+import PIL.Image
+import PIL.ExifTags
+
+from library.photo.exif_reader import ExifReaderError, read_exif_tags
+from library.photo.photo_file import get_exif, get_pillow_exif
+
+
+def save_image(filename: str, image_format: str, with_exif: bool):
+    image = PIL.Image.new('RGB', (32, 32), (200, 10, 10))
+    if not with_exif:
+        image.save(filename, format=image_format)
+        return
+
+    exif = image.getexif()
+    exif[PIL.ExifTags.Base.Make] = 'Apple'
+    exif[PIL.ExifTags.Base.Model] = 'iPhone 12'
+    exif[PIL.ExifTags.Base.Software] = 'VSCO'
+    exif[PIL.ExifTags.Base.DateTime] = '2022:04:17 15:13:50'
+    exif_ifd = exif.get_ifd(PIL.ExifTags.IFD.Exif)
+    exif_ifd[PIL.ExifTags.Base.DateTimeOriginal] = '2022:07:09 11:39:04'
+    exif_ifd[PIL.ExifTags.Base.OffsetTimeOriginal] = '+05:00'
+    exif_ifd[PIL.ExifTags.Base.SubsecTimeOriginal] = '005'
+    gps_ifd = exif.get_ifd(PIL.ExifTags.IFD.GPSInfo)
+    gps_ifd[PIL.ExifTags.GPS.GPSLatitudeRef] = 'N'
+    image.save(filename, format=image_format, exif=exif)
+
+
+@pytest.mark.parametrize(
+    'extension, image_format, with_exif',
+    [
+        ('jpg', 'JPEG', True),
+        ('jpg', 'JPEG', False),
+        ('png', 'PNG', False),
+        ('tif', 'TIFF', False),
+    ],
+)
+def test_get_exif_matches_pillow(tmp_path, extension, image_format, with_exif):
+    filename = str(tmp_path / f'image.{extension}')
+    save_image(filename, image_format, with_exif)
+
+    read_exif_tags(filename)  # must not fall back
+    assert get_exif(filename) == get_pillow_exif(filename)
+
+
+def test_read_exif_tags_unsupported(tmp_path):
+    filename = str(tmp_path / 'image.gif')
+    PIL.Image.new('RGB', (32, 32)).save(filename, format='GIF')
+    with pytest.raises(ExifReaderError):
+        read_exif_tags(filename)
@@ -1,6 +1,6 @@
 import pytest
 
-from library.photo.parse_timestamp import parse_timestamp
+from library.photo.parse_timestamp import parse_timestamp, parse_timestamps
 
 
 @pytest.mark.parametrize(
@@ -30,9 +30,18 @@ from library.photo.parse_timestamp import parse_timestamp
         ('IMG_20191028_081550_384.jpg', 1572236150),
         ('IMG_20191028_081550_384', 1572236150),
         ('20191028081550', 1572236150),
+        ('20180510171331+a20190101010101_x', 1546290061),
+        ('20180510171331+a20190101010101', 1525958011),
+        ('x20180510171331yz_20190101010101 ', 1546290061),
+        ('2018-05-10 17:13:31x_2019-01-01 01:01:01', 1546290061),
     ],
 )
 def test_parse_timestamp(line, expected):
 	# TODO: check timezones
     timestamp = parse_timestamp(line)
-    assert timestamp == expected
\ No newline at end of file
+    assert timestamp == expected
+
+
+def test_parse_timestamps():
+    lines = ['Screenshot_20191231-190906.png', 'photo311519012136790160.png', '2021-11-06 16:18:21.jpg']
+    assert parse_timestamps(lines) == [1577804946, None, 1636201101]
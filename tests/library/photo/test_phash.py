@@ -0,0 +1,39 @@
+import random
+
+import PIL.Image
+import PIL.ImageFilter
+
+from library.photo.phash import BKTree, hamming_distance, perceptual_hash
+
+
+def test_perceptual_hash_survives_resize(tmp_path):
+    image = PIL.Image.new('RGB', (400, 300))
+    for x in range(400):
+        for y in range(300):
+            image.putpixel((x, y), ((x * 3) % 256, (y * 5) % 256, ((x + y) * 2) % 256))
+
+    original = str(tmp_path / 'original.jpg')
+    resized = str(tmp_path / 'resized.jpg')
+    other = str(tmp_path / 'other.jpg')
+    image.save(original, quality=95)
+    image.resize((200, 150)).filter(PIL.ImageFilter.GaussianBlur(1)).save(resized, quality=60)
+    image.transpose(PIL.Image.Transpose.FLIP_LEFT_RIGHT).rotate(90, expand=True).save(other)
+
+    assert hamming_distance(perceptual_hash(original), perceptual_hash(resized)) <= 6
+    assert hamming_distance(perceptual_hash(original), perceptual_hash(other)) > 6
+
+
+def test_bk_tree_search():
+    rng = random.Random(7)
+    values = [rng.getrandbits(64) for _ in range(2000)]
+    tree = BKTree()
+    for index, value in enumerate(values):
+        tree.add(value, index)
+
+    query = values[0] ^ 0b1011
+    expected = sorted(
+        (hamming_distance(query, value), index)
+        for index, value in enumerate(values)
+        if hamming_distance(query, value) <= 12
+    )
+    assert sorted(tree.search(query, 12)) == expected
@@ -0,0 +1,44 @@
+import hashlib
+import os
+
+import pytest
+
+from library.copier import CopyJob, copy_file, copy_files
+
+
+def test_copy_file(tmp_path):
+    src = str(tmp_path / 'src.jpg')
+    with open(src, 'wb') as f:
+        f.write(b'photo' * 100000)
+
+    result = copy_file(src, str(tmp_path / 'dst.jpg'), buffer_size=4096)
+    assert result.md5 == hashlib.md5(b'photo' * 100000).hexdigest()
+    assert result.size == 500000
+    assert result.mtime_ns == os.stat(src).st_mtime_ns
+
+    with pytest.raises(RuntimeError):
+        copy_file(src, str(tmp_path / 'broken.jpg'), expected_md5='0' * 32)
+    assert sorted(os.listdir(tmp_path)) == ['dst.jpg', 'src.jpg']
+
+    with open(str(tmp_path / 'killed.jpg.part'), 'wb') as f:
+        f.write(b'stale' * 200000)
+    copy_file(src, str(tmp_path / 'killed.jpg'))
+    assert sorted(os.listdir(tmp_path)) == ['dst.jpg', 'killed.jpg', 'src.jpg']
+    assert os.path.getsize(tmp_path / 'killed.jpg') == 500000
+
+
+def test_copy_files(tmp_path):
+    jobs = []
+    for index in range(5):
+        src = str(tmp_path / f'{index}.jpg')
+        with open(src, 'w') as f:
+            f.write(f'photo {index}')
+        jobs.append(CopyJob(src=src, dst=str(tmp_path / 'backup' / str(index % 2) / f'{index}.jpg')))
+
+    copied = []
+    results = copy_files(jobs, workers=2, on_copied=lambda result: copied.append(result.dst))
+    assert sorted(copied) == sorted(job.dst for job in jobs)
+    assert {result.md5 for result in results} == {hashlib.md5(f'photo {index}'.encode()).hexdigest() for index in range(5)}
+
+    with pytest.raises(RuntimeError):
+        copy_files(jobs[:1])
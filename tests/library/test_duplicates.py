@@ -0,0 +1,47 @@
+import collections
+import os
+
+import library.md5sum
+from library.duplicates import DuplicateFinder, same_content
+
+
+def write(path, data: bytes) -> str:
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+
+def test_duplicate_finder(tmp_path):
+    large = os.urandom(3 * library.md5sum.PARTIAL_SIZE)
+    middle = library.md5sum.PARTIAL_SIZE + 10
+    changed_middle = large[:middle] + bytes([large[middle] ^ 1]) + large[middle + 1:]
+
+    files = [
+        write(tmp_path / 'unique', b'unique'),
+        write(tmp_path / 'small_1', b'small'),
+        write(tmp_path / 'small_2', b'small'),
+        write(tmp_path / 'other', b'other'),
+        write(tmp_path / 'large_1', large),
+        write(tmp_path / 'large_2', large),
+        write(tmp_path / 'large_changed', changed_middle),
+        write(tmp_path / 'large_head', b'x' + large[1:]),
+    ]
+
+    finder = DuplicateFinder()
+    finder.add_dir(str(tmp_path))
+
+    assert finder.groups == [
+        [files[4], files[5]],
+        [files[1], files[2]],
+    ]
+
+    by_key = collections.defaultdict(set)
+    by_md5sum = collections.defaultdict(set)
+    for filename in files:
+        by_key[finder.keys[filename]].add(filename)
+        by_md5sum[library.md5sum.md5sum(filename)].add(filename)
+    assert sorted(map(sorted, by_key.values())) == sorted(map(sorted, by_md5sum.values()))
+
+    assert same_content(files[4], files[5])
+    assert not same_content(files[4], files[6])
+    assert not same_content(files[1], files[3])
@@ -0,0 +1,68 @@
+import os
+
+from library.files import JsonlWriter, Snapshot, SnapshotChanges, read_jsonl, scan_files
+
+
+def test_jsonl_resume_after_crash(tmp_path):
+    filename = str(tmp_path / 'data.jsonl')
+    with JsonlWriter(filename) as writer:
+        writer.write({'path': 'first'})
+        writer.write({'path': 'second'})
+
+    with open(filename, 'a') as f:
+        f.write('{"path": "thi')
+
+    assert [row['path'] for row in read_jsonl(filename)] == ['first', 'second']
+
+    with JsonlWriter(filename) as writer:
+        writer.write({'path': 'third'})
+
+    assert [row['path'] for row in read_jsonl(filename)] == ['first', 'second', 'third']
+
+
+def test_scan_files(tmp_path):
+    for path in ['a/1.JPG', 'a/2.jpg', 'a/3.png', 'a/b/4.Jpg', 'skip/5.jpg', 'c/skip/6.jpg', 'c/7.jpg', 'jpg']:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_bytes(b'12345')
+    (tmp_path / 'a' / 'broken.jpg').symlink_to(tmp_path / 'missing.jpg')
+
+    expected = [str(tmp_path / path) for path in ['a/1.JPG', 'a/2.jpg', 'a/b/4.Jpg', 'c/7.jpg']]
+    for workers in [0, 4]:
+        entries = list(scan_files([str(tmp_path)], extensions=['.jpg'], skip_paths=['skip'], with_stat=True, workers=workers))
+        assert [entry.path for entry in entries] == expected
+        assert all(entry.stat().st_size == 5 for entry in entries)
+
+
+def test_scan_files_deep_tree(tmp_path):
+    for index in range(50):
+        path = tmp_path.joinpath(*str(index)) / f'{index}.jpg'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'1')
+
+    expected = [entry.path for entry in scan_files([str(tmp_path)])]
+    assert len(expected) == 50
+    assert [entry.path for entry in scan_files([str(tmp_path)], workers=2)] == expected
+
+
+def test_snapshot_changes(tmp_path):
+    for name in ['same', 'modified', 'removed', 'renamed']:
+        (tmp_path / name).write_bytes(name.encode())
+
+    filename = str(tmp_path / 'snapshot.json')
+    Snapshot.scan([str(tmp_path)]).save(filename)
+    previous = Snapshot.load(filename)
+
+    (tmp_path / 'modified').write_bytes(b'modified, new content')
+    (tmp_path / 'removed').unlink()
+    (tmp_path / 'renamed').rename(tmp_path / 'renamed_new')
+    (tmp_path / 'added').write_bytes(b'added')
+    os.remove(filename)
+
+    changes = Snapshot.scan([str(tmp_path)]).changes_since(previous)
+    assert changes == SnapshotChanges(
+        added=[str(tmp_path / 'added')],
+        modified=[str(tmp_path / 'modified')],
+        removed=[str(tmp_path / 'removed')],
+        renamed={str(tmp_path / 'renamed'): str(tmp_path / 'renamed_new')},
+    )
+    assert not Snapshot.scan([str(tmp_path)]).changes_since(Snapshot.scan([str(tmp_path)]))
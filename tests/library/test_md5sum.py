@@ -0,0 +1,39 @@
+import hashlib
+import os
+
+import pytest
+
+import library.md5sum
+from library.md5sum import PARTIAL, PARTIAL_SIZE, file_digests, md5sum, md5sum_many, partial_md5sum
+
+
+@pytest.mark.parametrize('size', [0, 100, 2 * PARTIAL_SIZE, 2 * PARTIAL_SIZE + 1, 5 * PARTIAL_SIZE + 123])
+@pytest.mark.parametrize('buffer_size', [1000, 2 ** 16, 2 ** 20])
+def test_file_digests(tmp_path, size, buffer_size):
+    filename = str(tmp_path / 'file.bin')
+    data = os.urandom(size)
+    with open(filename, 'wb') as f:
+        f.write(data)
+
+    digests = file_digests(filename, ['md5', 'blake2b', 'sha256'], partial=True, buffer_size=buffer_size)
+    assert digests == {
+        'md5': hashlib.md5(data).hexdigest(),
+        'blake2b': hashlib.blake2b(data).hexdigest(),
+        'sha256': hashlib.sha256(data).hexdigest(),
+        PARTIAL: partial_md5sum(filename),
+    }
+    assert md5sum(filename, buffer_size=buffer_size) == digests['md5']
+
+
+def test_md5sum_many(tmp_path, monkeypatch):
+    monkeypatch.setattr(library.md5sum, 'MMAP_MIN_SIZE', 1000)
+    filenames, expected = [], []
+    for index, size in enumerate([0, 10, 999, 1000, 5000] * 4):
+        filename = str(tmp_path / f'{index}.bin')
+        data = os.urandom(size)
+        with open(filename, 'wb') as f:
+            f.write(data)
+        filenames.append(filename)
+        expected.append((filename, hashlib.md5(data).hexdigest()))
+
+    assert list(md5sum_many(filenames, workers=3)) == expected
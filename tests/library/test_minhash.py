@@ -0,0 +1,36 @@
+import random
+
+from library.minhash import DirSketches
+
+
+def random_digests(rng, count):
+    return [rng.randbytes(16).hex() for _ in range(count)]
+
+
+def test_find_similar(tmp_path):
+    rng = random.Random(0)
+    small = random_digests(rng, 100)
+    large = random_digests(rng, 2000)
+    old_tree = {'small': small, 'large': large}
+    new_tree = {
+        'small copy': small[:90],
+        'large copy': large[:1800] + random_digests(rng, 200),
+        'other': random_digests(rng, 2000),
+    }
+
+    filename = str(tmp_path / 'sketches.npz')
+    DirSketches.from_tree(new_tree).save(filename)
+    new_sketches = DirSketches.load(filename)
+    old_sketches = DirSketches.from_tree(old_tree)
+
+    small_matches = new_sketches.find_similar(old_sketches, old_sketches.names.index('small'))
+    assert [match.name for match in small_matches] == ['small copy']
+    assert small_matches[0].exact
+    assert small_matches[0].jaccard == 0.9
+    assert small_matches[0].containment == 0.9
+
+    large_matches = new_sketches.find_similar(old_sketches, old_sketches.names.index('large'))
+    assert [match.name for match in large_matches] == ['large copy']
+    assert not large_matches[0].exact
+    assert abs(large_matches[0].jaccard - 1800 / 2200) < 0.15
+    assert abs(large_matches[0].containment - 0.9) < 0.1
@@ -0,0 +1,86 @@
+import os
+import time
+
+import pytest
+
+from library.mover import FileMover, MoveJournal
+
+
+def test_plan_round_trip(tmp_path):
+    src = str(tmp_path / 'IMG_0001.jpg')
+    dst = str(tmp_path / '2021-01-01 10-00-00.jpg')
+    with open(src, 'wb') as f:
+        f.write(b'photo')
+
+    plan_file = str(tmp_path / 'plan.json')
+    file_mover = FileMover()
+    file_mover.add(src, dst)
+    file_mover.save_plan(plan_file, str(tmp_path))
+
+    assert list(FileMover.load_plan(plan_file, str(tmp_path)).get_mv_files()) == [(src, dst)]
+    with pytest.raises(RuntimeError):
+        FileMover.load_plan(plan_file, str(tmp_path / 'other'))
+
+    os.utime(src, (time.time() + 10, time.time() + 10))
+    with pytest.raises(RuntimeError):
+        FileMover.load_plan(plan_file, str(tmp_path))
+
+    os.remove(src)
+    with pytest.raises(RuntimeError):
+        FileMover.load_plan(plan_file, str(tmp_path))
+
+
+def _write(path, content: bytes) -> str:
+    with open(path, 'wb') as f:
+        f.write(content)
+    return str(path)
+
+
+def test_collisions(tmp_path):
+    first = _write(tmp_path / 'a.jpg', b'photo')
+    same = _write(tmp_path / 'b.jpg', b'photo')
+    dst = str(tmp_path / 'dst' / 'c.jpg')
+
+    file_mover = FileMover()
+    file_mover.add(first, dst)
+    file_mover.add(same, dst)
+    assert list(file_mover.get_mv_files()) == [(first, dst)]
+    assert list(file_mover.get_rm_files()) == [same]
+
+    other = _write(tmp_path / 'd.jpg', b'other photo')
+    file_mover.add(other, dst)
+    with pytest.raises(RuntimeError):
+        list(file_mover.get_mv_files())
+
+    with pytest.raises(RuntimeError):
+        FileMover().add(first, same)
+
+
+def test_journal(tmp_path):
+    first = _write(tmp_path / 'a.jpg', b'first')
+    second = _write(tmp_path / 'b.jpg', b'second')
+    same = _write(tmp_path / 'c.jpg', b'second')
+    dst_dir = tmp_path / 'dst'
+    operations = [
+        {'op': 'mkdir', 'path': str(dst_dir)},
+        {'op': 'mv', 'src': first, 'dst': str(dst_dir / 'a.jpg')},
+        {'op': 'mv', 'src': second, 'dst': str(dst_dir / 'b.jpg')},
+        {'op': 'rm', 'path': same, 'same_as': str(dst_dir / 'b.jpg')},
+    ]
+
+    # crash after first move, its record is lost
+    journal_file = str(tmp_path / 'moves.jsonl')
+    MoveJournal.create(journal_file, operations)
+    os.mkdir(dst_dir)
+    os.rename(first, dst_dir / 'a.jpg')
+    with open(journal_file, 'a') as f:
+        f.write('{"done": 0}\n{"done"')
+
+    MoveJournal(journal_file).rollback()
+    assert sorted(os.listdir(tmp_path)) == ['a.jpg', 'b.jpg', 'c.jpg']
+
+    MoveJournal.create(journal_file, operations)
+    os.mkdir(dst_dir)
+    MoveJournal(journal_file).replay()
+    assert sorted(os.listdir(tmp_path)) == ['dst']
+    assert sorted(os.listdir(dst_dir)) == ['a.jpg', 'b.jpg']
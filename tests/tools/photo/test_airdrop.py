@@ -1,6 +1,10 @@
+import datetime
+import os
+
+import PIL.Image
 import pytest
 
-from tools.photo.airdrop import rename
+from tools.photo.airdrop import get_dst_dir_name, get_suffix, rename, scan_photo_files
 
 
 @pytest.mark.parametrize(
@@ -24,3 +28,26 @@ from tools.photo.airdrop import rename
 )
 def test_rename(filename, expected):
     assert rename(filename) == expected
+
+
+def test_scan_photo_files(tmp_path):
+    vsco_dir = tmp_path / 'FEAC8BBA-7A25-409F-8E6F-715FE57ADA8B'
+    vsco_dir.mkdir()
+    plain_dir = tmp_path / 'IMG_0967'
+    plain_dir.mkdir()
+
+    filenames = [str(vsco_dir / 'IMG_0001.JPG'), str(vsco_dir / 'IMG_0002.MOV'), str(plain_dir / 'IMG_0967.JPG')]
+    for filename, software in [(filenames[0], 'VSCO Cam'), (filenames[2], 'iOS 15.0')]:
+        exif = PIL.Image.Exif()
+        exif[0x0131] = software  # Software
+        PIL.Image.new('RGB', (16, 16)).save(filename, exif=exif)
+    with open(filenames[1], 'wb') as f:
+        f.write(b'not a video')
+
+    timestamp = datetime.datetime(2021, 7, 31, 12, tzinfo=datetime.timezone.utc).timestamp()
+    for filename in filenames:
+        os.utime(filename, (timestamp, timestamp))
+
+    photo_files = scan_photo_files(filenames, workers=2)
+    assert [get_suffix(photo_file) for photo_file in photo_files] == ['VSCO', 'VSCO - video', 'originals']
+    assert get_dst_dir_name(photo_files) == '2021.07.31 airdrop'
@@ -0,0 +1,117 @@
+import hashlib
+import os
+
+import library.md5sum
+from tools.photo.compare import Hashes, calc_hashes, copy_missing, get_changed_dirs, load_sketches
+from tools.photo.hashes_file import HashesFile
+
+
+def test_calc_hashes_reuses_unchanged_files(tmp_path, monkeypatch):
+    root = tmp_path / 'root'
+    (root / 'a').mkdir(parents=True)
+    for name in ['first.jpg', 'second.jpg']:
+        with open(root / 'a' / name, 'w') as f:
+            f.write(name)
+
+    hashes_file = str(tmp_path / 'hashes.json')
+    calc_hashes(str(root), workers=2).save(hashes_file)
+    previous = Hashes.load(hashes_file)
+    assert set(previous.tree['a']) == {'first.jpg', 'second.jpg'}
+
+    hashed = []
+
+    def md5sum(filename):
+        hashed.append(os.path.basename(filename))
+        return 'changed'
+
+    with open(root / 'a' / 'second.jpg', 'w') as f:
+        f.write('second, edited')
+
+    monkeypatch.setattr(library.md5sum, 'md5sum', md5sum)
+    hashes = calc_hashes(str(root), previous=previous, workers=2)
+
+    assert hashed == ['second.jpg']
+    assert hashes.tree['a'] == {'first.jpg': previous.tree['a']['first.jpg'], 'second.jpg': 'changed'}
+
+
+def test_binary_hashes_file(tmp_path):
+    hashes = Hashes(
+        root='/photo',
+        tree={
+            '2020/a': {'1.jpg': '00' * 16, '2.jpg': 'ff' * 16},
+            '2020/b': {'1.jpg': '00' * 16, 'фото.jpg': '12' * 16},
+        },
+        stats={
+            '2020/a': {'1.jpg': [1, 10], '2.jpg': [2, 20]},
+            '2020/b': {'1.jpg': [1, 30], 'фото.jpg': [3, 40]},
+        },
+    )
+    filename = str(tmp_path / 'hashes.bin')
+    hashes.save_binary(filename)
+
+    loaded = Hashes.load(filename)
+    assert loaded.merkle == hashes.get_merkle()
+    assert loaded == hashes
+    with HashesFile(filename) as hashes_file:
+        assert len(hashes_file) == 4
+        for file_hash in ['00' * 16, '12' * 16, 'ff' * 16, '34' * 16]:
+            assert sorted(hashes_file.dirs_by_hash[file_hash]) == sorted(hashes.dirs_by_hash[file_hash])
+
+
+def test_load_sketches(tmp_path):
+    hashes = Hashes(
+        root='/photo',
+        tree={
+            'a': {f'{index}.jpg': hashlib.md5(b'a%d' % index).hexdigest() for index in range(10)},
+            'b': {f'{index}.jpg': hashlib.md5(b'b%d' % index).hexdigest() for index in range(10)},
+        },
+    )
+    hashes_file = str(tmp_path / 'hashes.json')
+    hashes.save(hashes_file)
+
+    sketches = load_sketches(hashes_file)
+    assert os.path.exists(f'{hashes_file}.sketches.npz')
+    assert [match.name for match in sketches.find_similar(sketches, sketches.names.index('a'))] == ['a']
+
+
+def test_get_changed_dirs():
+    tree = {
+        '/photo': {'root.jpg': '01' * 16},
+        '2020/a': {'1.jpg': '02' * 16},
+        '2020/b': {'1.jpg': '03' * 16},
+        '2021/c/d': {'1.jpg': '04' * 16},
+    }
+    old_hashes = Hashes(root='/photo', tree=tree)
+    new_hashes = Hashes(root='/backup', tree={
+        '/backup': {'root.jpg': '01' * 16},
+        '2020/a': {'1.jpg': '02' * 16},
+        '2020/b': {'1.jpg': '03' * 16, '2.jpg': '05' * 16},
+        '2021/c/d': {'1.jpg': '04' * 16},
+    })
+
+    merkle = old_hashes.get_merkle()
+    assert set(merkle) == {'', '2020', '2020/a', '2020/b', '2021', '2021/c', '2021/c/d'}
+    # root has own files and a changed subtree
+    assert sorted(get_changed_dirs(old_hashes=old_hashes, new_merkle=new_hashes.get_merkle())) == ['/photo', '2020/b']
+    assert get_changed_dirs(old_hashes=old_hashes, new_merkle=merkle) == []
+
+
+def test_copy_missing(tmp_path):
+    old_root, new_root = tmp_path / 'old', tmp_path / 'new'
+    (old_root / '2021-01-01 trip').mkdir(parents=True)
+    new_root.mkdir()
+    for name in ['first.jpg', 'second.jpg']:
+        with open(old_root / '2021-01-01 trip' / name, 'w') as f:
+            f.write(name)
+    with open(new_root / 'first.jpg', 'w') as f:
+        f.write('first.jpg')
+
+    old_hashes_file, new_hashes_file = str(tmp_path / 'old.json'), str(tmp_path / 'new.json')
+    calc_hashes(str(old_root)).save(old_hashes_file)
+    calc_hashes(str(new_root)).save(new_hashes_file)
+
+    copy_missing(old_hashes_file=old_hashes_file, new_hashes_file=new_hashes_file, dst_root=str(new_root))
+
+    new_hashes = Hashes.load(new_hashes_file)
+    assert new_hashes.tree['2021-01-01 trip'] == {'second.jpg': hashlib.md5(b'second.jpg').hexdigest()}
+    assert new_hashes.get_merkle() == calc_hashes(str(new_root)).merkle
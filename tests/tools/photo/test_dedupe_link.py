@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from library.mover import MoveJournal
+from tools.photo.dedupe_link import get_reclaimed_bytes, plan_links
+
+
+def test_plan_and_undo_links(tmp_path):
+    paths = []
+    for name, content in [('a.jpg', b'photo'), ('b.jpg', b'photo'), ('c.jpg', b'photo'), ('d.jpg', b'other')]:
+        paths.append(str(tmp_path / name))
+        with open(paths[-1], 'wb') as f:
+            f.write(content)
+    first, second, linked, other = paths
+    os.remove(linked)
+    os.link(second, linked)
+
+    links = plan_links([[first, second, linked], [first, other, str(tmp_path / 'moved.jpg')]])
+    assert [(link.target, link.path) for link in links] == [(second, first)]
+    assert get_reclaimed_bytes(links) == 5
+
+    with open(f'{first}.link', 'wb') as f:
+        f.write(b'left by interrupted replay')
+    journal_file = str(tmp_path / 'links.jsonl')
+    MoveJournal.create(journal_file, [
+        {
+            'op': 'link', 'path': first, 'target': second, 'size': 5, 'mtime_ns': links[0].mtime_ns, 'mode': links[0].mode,
+            'target_size': links[0].target_size, 'target_mtime_ns': links[0].target_mtime_ns,
+        },
+    ]).replay(keep=True)
+    assert os.path.samefile(first, second)
+
+    MoveJournal(journal_file).rollback()
+    assert not os.path.samefile(first, second)
+    assert os.stat(first).st_mtime_ns == links[0].mtime_ns
+    with open(first, 'rb') as f:
+        assert f.read() == b'photo'
+    assert not os.path.exists(journal_file)
+
+
+def test_changed_target_is_not_linked(tmp_path):
+    paths = []
+    for name in ['a.jpg', 'b.jpg']:
+        paths.append(str(tmp_path / name))
+        with open(paths[-1], 'wb') as f:
+            f.write(b'photo')
+    links = plan_links([paths])
+    link = links[0]
+    with open(link.target, 'wb') as f:
+        f.write(b'edited')
+
+    journal = MoveJournal.create(str(tmp_path / 'links.jsonl'), [{
+        'op': 'link', 'path': link.path, 'target': link.target, 'size': link.size, 'mtime_ns': link.mtime_ns, 'mode': link.mode,
+        'target_size': link.target_size, 'target_mtime_ns': link.target_mtime_ns,
+    }])
+    with pytest.raises(RuntimeError):
+        journal.replay(keep=True)
+    with open(link.path, 'rb') as f:
+        assert f.read() == b'photo'
@@ -0,0 +1,52 @@
+import collections
+import random
+
+from library.photo.photo_file import PhotoInfo
+from tools.photo.deduplicate import Stats
+
+
+def get_pairwise_stats(photo_infos):
+    # straightforward quadratic implementation
+    matched_dirs = collections.defaultdict(int)
+    collision_counters = collections.defaultdict(int)
+    seen = collections.defaultdict(list)
+    for photo_info in photo_infos:
+        dir_name = photo_info.path.rsplit('/', 1)[0]
+        for same_dir in seen[photo_info.md5sum]:
+            collision_counters[same_dir] += 1
+            matched_dirs[tuple(sorted([dir_name, same_dir]))] += 1
+        if seen[photo_info.md5sum]:
+            collision_counters[dir_name] += 1
+        seen[photo_info.md5sum].append(dir_name)
+    return dict(matched_dirs), dict(collision_counters)
+
+
+def test_stats_matches_pairwise_counts():
+    rng = random.Random(42)
+    photo_infos = [
+        PhotoInfo(
+            path=f'/photos/dir_{rng.randrange(12)}/file_{index}.jpg',
+            md5sum=f'{rng.randrange(60):032x}',
+            timestamps=[],
+        )
+        for index in range(500)
+    ]
+
+    stats = Stats()
+    for photo_info in photo_infos:
+        stats.add_photo(photo_info)
+
+    matched_dirs, collision_counters = get_pairwise_stats(photo_infos)
+    assert stats.matched_dirs == matched_dirs
+    assert stats.collision_counters == collision_counters
+
+    top = stats.most_similar_dirs('/photos/dir_0', k=3)
+    expected = sorted(
+        (
+            (matches, first if second == '/photos/dir_0' else second)
+            for (first, second), matches in matched_dirs.items()
+            if '/photos/dir_0' in (first, second) and first != second
+        ),
+        reverse=True,
+    )[:3]
+    assert [matches for _, matches in top] == [matches for matches, _ in expected]
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from tools.running.process.analyze import DefaultLimits, Limits, analyze_track, clean
+from tools.running.track import Track
+from tools.running.trackpoint import TrackPoint
+
+
+def reference_analyze_track(track: Track, limits: Limits):
+    all_broken_points = []
+    while True:
+        track, broken_points = clean(track, limits)
+        all_broken_points += broken_points
+        if not broken_points:
+            return track, all_broken_points
+
+
+def generate_noisy_track(count: int, seed: int) -> Track:
+    # walk with single spikes, runs of spikes and gaps without position
+    rng = random.Random(seed)
+    latitude, longitude = 55.7, 37.6
+    points = []
+    spike_run = 0
+    timestamp = 1575203458
+    for index in range(count):
+        timestamp += rng.choice([1, 1, 1, 2, 5])
+        latitude += rng.uniform(-3e-5, 3e-5)
+        longitude += rng.uniform(-5e-5, 5e-5)
+        if spike_run == 0 and rng.random() < 0.05:
+            spike_run = rng.randint(1, 4)
+        if spike_run:
+            spike_run -= 1
+            point_latitude = latitude + rng.uniform(-0.01, 0.01)
+            point_longitude = longitude + rng.uniform(-0.01, 0.01)
+        else:
+            point_latitude, point_longitude = latitude, longitude
+        has_position = rng.random() > 0.02
+        points.append(TrackPoint(
+            latitude=point_latitude if has_position else None,
+            longitude=point_longitude if has_position else None,
+            timestamp=timestamp,
+        ))
+    return Track(filename=f'noisy-{seed}.FIT', points=points)
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_analyze_track_matches_clean(seed):
+    track = generate_noisy_track(400, seed)
+    rng = random.Random(seed)
+    for limits in [DefaultLimits, Limits(speed=rng.randint(3, 20), distance=rng.uniform(0.01, 0.3), triangle=rng.uniform(0.3, 0.95))]:
+        expected_track, expected_broken = reference_analyze_track(track, limits)
+        clean_track, broken = analyze_track(track, limits)
+        assert [point.timestamp for point in broken] == [point.timestamp for point in expected_broken]
+        assert clean_track.ok_points == expected_track.ok_points
+
+
+def test_analyze_track_too_short():
+    track = generate_noisy_track(3, 0)
+    points = track.ok_points[:2] + [TrackPoint(latitude=56.7, longitude=38.6, timestamp=1575203470)]
+    with pytest.raises(AssertionError):
+        reference_analyze_track(Track(filename='short.FIT', points=points), DefaultLimits)
+    with pytest.raises(AssertionError):
+        analyze_track(Track(filename='short.FIT', points=points), DefaultLimits)
@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+from tools.running import geodesic
+from tools.running.gpxwriter import to_gpx
+from tools.running.segment import Segment
+from tools.running.track import Track
+from tools.running.track_columns import TrackColumns
+from tools.running.trackpoint import TrackPoint
+
+
+def generate_points(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    points = []
+    for index in range(count):
+        has_position = rng.random() > 0.1
+        points.append(TrackPoint(
+            longitude=37.6 + rng.uniform(-0.01, 0.01) if has_position else None,
+            latitude=55.7 + rng.uniform(-0.01, 0.01) if has_position else None,
+            altitude=rng.choice([None, 150.5]),
+            timestamp=1575203458 + index,
+            cadence=rng.choice([None, 80]),
+            heart_rate=rng.randint(100, 180),
+            distance_m=float(index * 3),
+            speed=rng.choice([None, 3.25]),
+        ))
+    return points
+
+
+def test_columns_match_points():
+    points = generate_points(1000)
+    columns = TrackColumns.from_points(points)
+    assert len(columns) == len(points)
+    assert list(columns) == points
+    assert columns[-1] == points[-1]
+    assert list(columns[columns.ok]) == [point for point in points if point.is_ok]
+
+    track = Track(filename='track.FIT', points=points)
+    columns_track = Track(filename='track.FIT', points=columns)
+    for name in ['ok_points', 'ok_count', 'failures_count', 'min_lat', 'max_lat', 'min_long', 'max_long', 'middle_lat', 'start_timestamp']:
+        assert getattr(columns_track, name) == getattr(track, name), name
+    assert columns_track.total_distance == pytest.approx(track.total_distance)
+    assert columns_track == Track(filename='track.FIT', points=TrackColumns.from_points(points))
+    assert columns_track != Track(filename='track.FIT', points=columns[1:])
+
+    assert to_gpx(columns[columns.ok]).to_xml() == to_gpx(track.ok_points).to_xml()
+
+
+def test_geodesic_modes():
+    points = [point for point in generate_points(200) if point.is_ok]
+    points[100].timestamp += 20000
+    track = Track(filename='track.FIT', points=points)
+    segments = [Segment(start, finish) for start, finish in zip(points[:-1], points[1:])]
+
+    expected = [segment.distance for segment in segments]
+    latitudes = [point.latitude for point in points]
+    longitudes = [point.longitude for point in points]
+    assert geodesic.segment_distances(latitudes, longitudes, mode=geodesic.Mode.Exact).tolist() == expected
+    assert geodesic.segment_distances(latitudes, longitudes, mode=geodesic.Mode.Andoyer) == pytest.approx(expected, rel=2e-5)
+    assert geodesic.segment_distances(latitudes, longitudes, mode=geodesic.Mode.Haversine) == pytest.approx(expected, rel=6e-3)
+    assert geodesic.pair_distances([55.7], [37.6], [55.7], [37.6]).tolist() == [0.]
+
+    counted = [segment for segment in segments if segment.duration < 10000]
+    assert len(counted) == len(segments) - 1
+    assert track.total_distance == pytest.approx(sum(segment.distance for segment in counted), rel=1e-12)
+    assert track.get_total_distance(geodesic.Mode.Andoyer) == pytest.approx(track.total_distance, rel=2e-5)
+    assert track.total_duration == sum(segment.duration for segment in counted)
@@ -2,5 +2,9 @@ import tools.photo.airdrop
 import tools.photo.calculate
 import tools.photo.compare
 import tools.photo.deduplicate
+import tools.photo.dedupe_link
+import tools.photo.hashes_file
+import tools.photo.journal
 import tools.photo.parse
 import tools.photo.renamer
+import tools.photo.similar
@@ -6,9 +6,10 @@ import re
 import library.files
 import library.mover
 
-from library.photo.photo_file import PhotoFile
+from library.photo.catalog import PhotoCatalog, open_catalog
+from library.photo.photo_file import PREFETCH_WORKERS, PhotoFile, prefetch_photo_files
 
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import logging
 log = logging.getLogger(__name__)
@@ -102,24 +103,40 @@ def get_photo_files(photo_dirs: List[str]) -> List[str]:
     return all_photo_files
 
 
-def is_vsco(filename: str) -> bool:
-    return (filename.split('.')[-1].lower() == 'jpg') and PhotoFile(filename).is_vsco
+def scan_photo_files(
+    filenames: List[str],
+    *,
+    catalog: Optional[PhotoCatalog] = None,
+    workers: int = PREFETCH_WORKERS,
+) -> List[PhotoFile]:
+    # one pass: stat of every file and vsco flag from jpg headers
+    return prefetch_photo_files(
+        filenames,
+        attribute='is_vsco',
+        catalog=catalog,
+        workers=workers,
+        extensions={'jpg'},
+    )
+
+
+def is_vsco(photo_file: PhotoFile) -> bool:
+    return (photo_file.extension.lower() == 'jpg') and photo_file.is_vsco
 
 
-def get_suffix(source_filename: str) -> str:
-    if is_vsco(source_filename):
+def get_suffix(photo_file: PhotoFile) -> str:
+    if is_vsco(photo_file):
         return 'VSCO'
 
-    dir_basename = os.path.basename(os.path.dirname(source_filename))
-    if (source_filename.split('.')[-1].lower() == 'mov') and re.match(f'^{VSCO_RE}$', dir_basename):
+    dir_basename = os.path.basename(os.path.dirname(photo_file.Path))
+    if (photo_file.extension.lower() == 'mov') and re.match(f'^{VSCO_RE}$', dir_basename):
         return 'VSCO - video'
 
     return 'originals'
 
-def get_dst_dir_name(source_files: list) -> str:
+def get_dst_dir_name(photo_files: List[PhotoFile]) -> str:
     mod_dates = set()
-    for src in source_files:
-        mod_time = os.path.getmtime(src)
+    for photo_file in photo_files:
+        mod_time = photo_file.CatalogEntry.mtime_ns // 10 ** 9
         mod_dt = datetime.datetime.utcfromtimestamp(mod_time)
         mod_dates.add(mod_dt.strftime('%Y.%m.%d'))
 
@@ -134,6 +151,9 @@ def import_airdrop(
     dirname: str,
     regexp_list: list,
     do_move: bool,
+    catalog_file: str = None,
+    workers: int = PREFETCH_WORKERS,
+    journal_file: str = None,
 ):
     log.info(f'Import in {dirname!r}, regexps:')
     for r in regexp_list:
@@ -145,28 +165,25 @@ def import_airdrop(
     if not filenames:
         return 
 
-    dst_dir_name = get_dst_dir_name(filenames)
+    with open_catalog(catalog_file) as catalog:
+        photo_files = scan_photo_files(filenames, catalog=catalog, workers=workers)
+
+    dst_dir_name = get_dst_dir_name(photo_files)
 
     file_mover = library.mover.FileMover()
-    for src in filenames:
-        suffix = get_suffix(src)
-        dst = os.path.join(dirname, f'{dst_dir_name} - {suffix}', rename(src))
-        file_mover.add(src, dst)
+    for photo_file in photo_files:
+        dst = os.path.join(dirname, f'{dst_dir_name} - {get_suffix(photo_file)}', rename(photo_file.Path))
+        file_mover.add(photo_file.Path, dst)
 
     if do_move:
-        for dirname in file_mover.get_dst_dirnames():
-            if os.path.exists(dirname):
-                raise RuntimeError(f'Dir already exists: {dirname!r}')
-            os.mkdir(dirname)
-
-        for src, dst in file_mover.get_mv_files(with_log=True):
-            os.rename(src, dst)
+        for dst_dirname in file_mover.get_dst_dirnames():
+            if os.path.exists(dst_dirname):
+                raise RuntimeError(f'Dir already exists: {dst_dirname!r}')
 
-        for filename in file_mover.get_rm_files(with_log=True):
-            os.remove(filename)
+        file_mover.execute(journal_file or os.path.join(dirname, library.mover.JOURNAL_NAME))
 
-        if any(list(library.files.walk(dirname)) for dirname in dirnames):
-            raise RuntimeError(f'Dir is not empty yet: {photo_dir!r}')
+        if any(list(library.files.walk(photo_dir)) for photo_dir in dirnames):
+            raise RuntimeError(f'Dir is not empty yet: {dirnames!r}')
 
         for photo_dir in dirnames:
             os.rmdir(photo_dir)
@@ -184,10 +201,16 @@ def run_import_airdrop(args):
         dirname=args.dir,
         regexp_list=REGEXPS,
         do_move=args.move,
+        catalog_file=args.catalog,
+        workers=args.workers,
+        journal_file=args.journal,
     )
 
 
 def populate_parser(parser):
     parser.add_argument('--dir', help='Work dir', default=library.files.Location.Downloads)
     parser.add_argument('--move', help='Do move', action='store_true')
+    parser.add_argument('--catalog', help='Sqlite catalog to reuse metadata of unchanged files')
+    parser.add_argument('--workers', help='Threads to read photos in parallel', type=int, default=PREFETCH_WORKERS)
+    parser.add_argument('--journal', help=f'Journal file to recover interrupted moves, default is {library.mover.JOURNAL_NAME} in work dir')
     parser.set_defaults(func=run_import_airdrop)
@@ -1,7 +1,15 @@
+import library.md5sum
+from library.photo.catalog import CatalogEntry, PhotoCatalog, open_catalog
+from library.photo.parse_timestamp import parse_timestamp
 from library.photo.photo_file import PhotoFile, PhotoInfo
-from library.files import get_filenames, save_json, open_dir
+from library.files import JsonlWriter, Snapshot, get_filenames, is_jsonl, open_dir, read_json_rows, read_jsonl, save_json
 import attr
-import json
+import collections
+import concurrent.futures
+import os
+import time
+
+from typing import Iterator, Optional, Tuple
 
 from tools.photo.deduplicate import Stats
 
@@ -17,6 +25,172 @@ SKIP_EXTENSIONS = {
     'heic',
 }
 
+PHOTO_INFO_KEYS = {'md5sum', 'timestamp'}
+IN_FLIGHT_PER_WORKER = 4
+
+
+def get_photo_filenames(
+    *,
+    dirnames: list[str],
+    filenames: list[str],
+    skip_paths: list[str],
+    walk_workers: int = 0,
+) -> list[str]:
+    photo_filenames = []
+    for filename in get_filenames(
+        dirs=dirnames,
+        files=filenames,
+        skip_paths=skip_paths,
+        workers=walk_workers,
+    ):
+        extension = filename.split('.')[-1].lower()
+
+        if extension in SKIP_EXTENSIONS:
+            continue
+
+        if extension not in PARSE_EXTENSIONS:
+            open_dir(filename)
+            raise RuntimeError(f'Unknown file extension: {filename!r}: {extension!r}')
+
+        photo_filenames.append(filename)
+
+    photo_filenames.sort()
+    return photo_filenames
+
+
+def _get_photo_info(filename: str) -> Tuple[dict, CatalogEntry]:
+    photo_file = PhotoFile(filename)
+    return attr.asdict(photo_file.photo_info), photo_file.CatalogEntry
+
+
+def iter_photo_infos(
+    filenames: list[str],
+    *,
+    catalog: Optional[PhotoCatalog] = None,
+    workers: int = 0,
+) -> Iterator[PhotoInfo]:
+    start_time = time.time()
+    files_count, read_bytes = 0, 0
+
+    if workers <= 1:
+        # md5 of next files is computed in threads while current file is parsed,
+        # at most max_in_flight files are read ahead, cached or not
+        max_in_flight = library.md5sum.WORKERS * IN_FLIGHT_PER_WORKER
+        with concurrent.futures.ThreadPoolExecutor(max_workers=library.md5sum.WORKERS) as executor:
+            ahead = collections.deque()
+
+            def pop_result() -> PhotoInfo:
+                photo_file, md5_future = ahead.popleft()
+                if md5_future is not None:
+                    photo_file.set_md5sum(md5_future.result())
+                return photo_file.photo_info
+
+            for filename in filenames:
+                photo_file = PhotoFile(filename, catalog=catalog)
+                if not PHOTO_INFO_KEYS <= photo_file.CatalogEntry.values.keys():
+                    read_bytes += photo_file.CatalogEntry.size
+                md5_future = None
+                if 'md5sum' not in photo_file.CatalogEntry.values:
+                    md5_future = executor.submit(library.md5sum.md5sum, photo_file.Path)
+                ahead.append((photo_file, md5_future))
+
+                while len(ahead) >= max_in_flight:
+                    files_count += 1
+                    yield pop_result()
+
+            while ahead:
+                files_count += 1
+                yield pop_result()
+
+    else:
+        max_in_flight = workers * IN_FLIGHT_PER_WORKER
+        log.info(f'Processing {len(filenames)} files with {workers} workers')
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            # keep input order: cached files and futures share one queue
+            pending = collections.deque()
+            in_flight = 0
+
+            def pop_result() -> PhotoInfo:
+                nonlocal in_flight
+                item = pending.popleft()
+                if isinstance(item, PhotoFile):
+                    return item.photo_info
+
+                in_flight -= 1
+                row, entry = item.result()
+                if catalog is not None:
+                    catalog.merge(entry)
+                return PhotoInfo.from_dict(row)
+
+            for filename in filenames:
+                photo_file = PhotoFile(filename, catalog=catalog)
+                if PHOTO_INFO_KEYS <= photo_file.CatalogEntry.values.keys():
+                    pending.append(photo_file)
+                else:
+                    read_bytes += photo_file.CatalogEntry.size
+                    pending.append(executor.submit(_get_photo_info, filename))
+                    in_flight += 1
+
+                while in_flight >= max_in_flight or len(pending) > max_in_flight * 4:
+                    files_count += 1
+                    yield pop_result()
+
+            while pending:
+                files_count += 1
+                yield pop_result()
+
+    duration = max(time.time() - start_time, 1e-6)
+    log.info(
+        f'Processed {files_count} files, read {read_bytes / 2 ** 20:.1f} MB in {duration:.1f} seconds: '
+        f'{files_count / duration:.1f} files/s, {read_bytes / 2 ** 20 / duration:.1f} MB/s'
+    )
+
+
+def save_jsonl(
+    json_file: str,
+    filenames: list[str],
+    *,
+    catalog: Optional[PhotoCatalog] = None,
+    workers: int = 0,
+):
+    if os.path.exists(json_file):
+        done_paths = {row['path'] for row in read_jsonl(json_file)}
+        filenames = [filename for filename in filenames if filename not in done_paths]
+        log.info(f'Resuming {json_file!r}: {len(done_paths)} files are done, {len(filenames)} files left')
+
+    with JsonlWriter(json_file) as writer:
+        for photo_info in iter_photo_infos(filenames, catalog=catalog, workers=workers):
+            writer.write(attr.asdict(photo_info))
+
+
+def keep_unchanged_rows(json_file: str, snapshot: Snapshot, previous: Snapshot) -> list[dict]:
+    # rows of unchanged files, renamed files get new paths without reading them again
+    # unless the new name gives another fallback datetime
+    changes = snapshot.changes_since(previous)
+    modified = set(changes.modified)
+    rows = []
+    for row in read_json_rows(json_file):
+        path = changes.renamed.get(row['path'], row['path'])
+        if path != row['path'] and parse_timestamp(os.path.basename(path)) != parse_timestamp(os.path.basename(row['path'])):
+            continue
+        if path in snapshot.files and path not in modified:
+            row['path'] = path
+            rows.append(row)
+
+    tmp_file = f'{json_file}.tmp'
+    if is_jsonl(json_file):
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        with JsonlWriter(tmp_file) as writer:
+            for row in rows:
+                writer.write(row)
+    else:
+        save_json(tmp_file, rows)
+    os.replace(tmp_file, json_file)
+
+    log.info(f'Kept {len(rows)} rows of unchanged files in {json_file!r}')
+    return rows
+
 
 def calculate(
     *,
@@ -25,33 +199,42 @@ def calculate(
     skip_paths: list[str] = None,
     cached: bool = None,
     json_file: str = None,
+    catalog_file: str = None,
+    workers: int = 0,
+    walk_workers: int = 0,
+    snapshot_file: str = None,
 ):
     if not cached:
-        photo_files = []
-        for filename in get_filenames(
-            dirs=dirnames,
-            files=filenames,
+        photo_filenames = get_photo_filenames(
+            dirnames=dirnames,
+            filenames=filenames,
             skip_paths=skip_paths,
-        ):
-            extension = filename.split('.')[-1].lower()
-
-            if extension in SKIP_EXTENSIONS:
-                continue
-
-            if extension not in PARSE_EXTENSIONS:
-                open_dir(filename)
-                raise RuntimeError(f'Unknown file extension: {filename!r}: {extension!r}')
+            walk_workers=walk_workers,
+        )
 
-            photo_files.append(PhotoFile(filename))
+        rows = []
+        if snapshot_file:
+            snapshot = Snapshot.from_paths(photo_filenames)
+            if os.path.exists(snapshot_file) and os.path.exists(json_file):
+                rows = keep_unchanged_rows(json_file, snapshot, Snapshot.load(snapshot_file))
+                done_paths = {row['path'] for row in rows}
+                photo_filenames = [filename for filename in photo_filenames if filename not in done_paths]
 
-        rows = [attr.asdict(photo_file.photo_info) for photo_file in photo_files]
-        save_json(json_file, rows)
+        with open_catalog(catalog_file) as catalog:
+            if is_jsonl(json_file):
+                save_jsonl(json_file, photo_filenames, catalog=catalog, workers=workers)
+            else:
+                rows += [
+                    attr.asdict(photo_info)
+                    for photo_info in iter_photo_infos(photo_filenames, catalog=catalog, workers=workers)
+                ]
+                save_json(json_file, rows)
 
-    with open(json_file) as f:
-        photo_files_json = json.load(f)
+        if snapshot_file:
+            snapshot.save(snapshot_file)
 
     stats = Stats()
-    for row in photo_files_json:
+    for row in read_json_rows(json_file):
         stats.add_photo(PhotoInfo.from_dict(row))
     stats.process()
 
@@ -63,13 +246,21 @@ def run_calculate(args):
         skip_paths=args.skip,
         cached=args.cached,
         json_file=args.json_file,
+        catalog_file=args.catalog,
+        workers=args.workers,
+        walk_workers=args.walk_workers,
+        snapshot_file=args.snapshot,
     )
 
 
 def populate_parser(parser):
-    parser.add_argument('--json-file', help='Json file to store all data', default='data.json')
+    parser.add_argument('--json-file', help='Json file to store all data, *.jsonl is written line by line and resumed', default='data.json')
     parser.add_argument('--dir', help='Add dir to parsing', action='append', default=[])
     parser.add_argument('--skip', help='Exclude paths from parsing', action='append', default=[])
     parser.add_argument('--file', help='Add file to parsing', action='append', default=[])
     parser.add_argument('--cached', help='Use cached data file', action='store_true')
+    parser.add_argument('--catalog', help='Sqlite catalog to reuse metadata of unchanged files')
+    parser.add_argument('--workers', help='Processes to parse EXIF and hash files in parallel', type=int, default=0)
+    parser.add_argument('--snapshot', help='Snapshot file: process only files changed since previous run')
+    parser.add_argument('--walk-workers', help='Threads to list dirs in parallel, for cloud-synced mounts', type=int, default=0)
     parser.set_defaults(func=run_calculate)
@@ -2,12 +2,18 @@ import collections
 import enum
 import json
 import os
+import time
 
 from functools import cached_property
-from typing import Dict, List
+from typing import Dict, List, Optional
 
+import library.copier
+import library.duplicates
 import library.md5sum
 import library.files
+import library.minhash
+
+from tools.photo.hashes_file import HashesFile, is_hashes_file, merkle_digests, write_hashes_file
 
 import attr
 
@@ -51,37 +57,99 @@ class Defaults(object):
 
 defaults = Defaults()
 
+CALC_WORKERS = 8
 
-def run_calc(args):
-    root = defaults.GetRootLocation(args.mode)
-    result_file = defaults.GetJsonLocation(args.mode)
-    if not os.path.isdir(root):
-        raise RuntimeError(f'{root} is not a directory')
-
-    log.info(f'Calculating stats in root {root} and writing to {result_file}')
 
+def calc_hashes(root: str, *, previous: Optional['Hashes'] = None, workers: int = CALC_WORKERS) -> 'Hashes':
     hashes = Hashes(root=root)
+    start_time = time.time()
+    reused_count, read_bytes = 0, 0
 
+    to_hash = []
     for sub_root, _, files in os.walk(root):
-        hash_by_name = {file: library.md5sum.md5sum(os.path.join(sub_root, file)) for file in files}
-        if not hash_by_name:
+        if not files:
             continue
-        localized_root = sub_root.replace(root + os.sep, '').replace(os.sep, '/')
-        log.info(f'Found {len(hash_by_name):3d} files in {localized_root!r}')
+        localized_root = localize(root, sub_root)
+        old_tree = previous.tree.get(localized_root, {}) if previous else {}
+        old_stats = previous.stats.get(localized_root, {}) if previous else {}
+
+        hash_by_name, stat_by_name = {}, {}
+        for file in files:
+            path = os.path.join(sub_root, file)
+            stat = os.stat(path)
+            stat_by_name[file] = [stat.st_size, stat.st_mtime_ns]
+            if file in old_tree and old_stats.get(file) == stat_by_name[file]:
+                hash_by_name[file] = old_tree[file]
+                reused_count += 1
+            else:
+                to_hash.append((localized_root, file, path))
+                read_bytes += stat.st_size
+
+        log.info(f'Found {len(files):3d} files in {localized_root!r}, {len(files) - len(hash_by_name)} to hash')
         hashes.tree[localized_root] = hash_by_name
+        hashes.stats[localized_root] = stat_by_name
 
+    paths = [path for _, _, path in to_hash]
+    for (localized_root, file, _), (_, md5sum) in zip(to_hash, library.md5sum.md5sum_many(paths, workers=workers)):
+        hashes.tree[localized_root][file] = md5sum
+
+    hashes.merkle = merkle_digests(root, hashes.tree)
+
+    duration = max(time.time() - start_time, 1e-6)
+    log.info(
+        f'Reused {reused_count} hashes, hashed {len(to_hash)} files, {read_bytes / 2 ** 20:.1f} MB '
+        f'in {duration:.1f} seconds: {read_bytes / 2 ** 20 / duration:.1f} MB/s'
+    )
+    return hashes
+
+
+def run_calc(args):
+    root = args.root or defaults.GetRootLocation(args.mode)
+    result_file = args.hashes_file or defaults.GetJsonLocation(args.mode)
+    if not os.path.isdir(root):
+        raise RuntimeError(f'{root} is not a directory')
+
+    log.info(f'Calculating stats in root {root} and writing to {result_file}')
+
+    previous = None
+    if os.path.exists(result_file):
+        previous = Hashes.load(result_file)
+        if previous.root != root:
+            log.warning(f'Previous hashes are for {previous.root}, not for {root}: ignoring them')
+            previous = None
+
+    hashes = calc_hashes(root, previous=previous, workers=args.workers)
     hashes.save(result_file)
 
 
+def localize(root: str, sub_root: str) -> str:
+    return sub_root.replace(root + os.sep, '').replace(os.sep, '/')
+
+
+def hashes_from_keys(root: str, keys: Dict[str, str]) -> 'Hashes':
+    hashes = Hashes(root=root)
+    for path, key in sorted(keys.items()):
+        if path.startswith(root + os.sep):
+            sub_root, file = os.path.split(path)
+            hashes.tree.setdefault(localize(root, sub_root), {})[file] = key
+    return hashes
+
+
 @attr.s
 class Hashes:
     root: str = attr.ib()
-    tree: Dict[str, Dict[str, str]] = attr.ib(default={})
+    tree: Dict[str, Dict[str, str]] = attr.ib(factory=dict)
+    stats: Dict[str, Dict[str, List[int]]] = attr.ib(factory=dict)  # [size, mtime_ns] to reuse hashes
+    merkle: Dict[str, str] = attr.ib(factory=dict)  # subtree digests, see merkle_digests
 
     @classmethod
     def load(self, filename):
-        with open(filename) as f:
-            data = json.load(f)
+        if is_hashes_file(filename):
+            with HashesFile(filename) as hashes_file:
+                data = hashes_file.to_dict()
+        else:
+            with open(filename) as f:
+                data = json.load(f)
 
         hashes = Hashes(**data)
         log.info(f'Loaded hashes for {hashes.root}')
@@ -89,7 +157,9 @@ class Hashes:
 
     def save(self, filename):
         log.info(f'Saving info about {self.root} to {filename}')
-        with open(filename, 'w') as f:
+        # previous file stays intact until new one is complete
+        tmp_filename = f'{filename}.tmp'
+        with open(tmp_filename, 'w') as f:
             json.dump(
                 attr.asdict(self),
                 f,
@@ -98,6 +168,18 @@ class Hashes:
                 separators=(',', ': '),
                 ensure_ascii=False,
             )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filename, filename)
+
+    def save_binary(self, filename):
+        write_hashes_file(filename, root=self.root, tree=self.tree, stats=self.stats, merkle=self.merkle)
+
+    def get_merkle(self) -> Dict[str, str]:
+        # older snapshots have no stored digests
+        if not self.merkle:
+            self.merkle = merkle_digests(self.root, self.tree)
+        return self.merkle
 
     @cached_property
     def dirs_by_hash(self):
@@ -148,10 +230,118 @@ def visualize_states(exists: list):
         return 'All files are missing\n'
 
 
+def get_changed_dirs(*, old_hashes: 'Hashes', new_merkle: Dict[str, str]) -> List[str]:
+    old_merkle = old_hashes.get_merkle()
+    children = collections.defaultdict(list)
+    for path in old_merkle:
+        if path:
+            children[path.rpartition('/')[0]].append(path)
+
+    changed_dirs, same_subtrees = [], []
+    paths = ['']
+    while paths:
+        path = paths.pop()
+        if new_merkle.get(path) == old_merkle[path]:
+            same_subtrees.append(path)
+            continue
+
+        dir_name = path or old_hashes.root
+        if dir_name in old_hashes.tree:
+            changed_dirs.append(dir_name)
+        paths.extend(children[path])
+
+    log.info(
+        f'Skipping {len(same_subtrees)} identical subtrees, '
+        f'{len(changed_dirs)} of {len(old_hashes.tree)} dirs differ'
+    )
+    for path in sorted(same_subtrees):
+        log.debug(f'Identical subtree {path or old_hashes.root!r}')
+    return changed_dirs
+
+
 def compare(*, old_hashes_file: str, new_hashes_file: str):
     old_hashes = Hashes.load(old_hashes_file)
-    new_hashes = Hashes.load(new_hashes_file)
-    for oldDir, oldHashes in old_hashes.clean_tree.items():
+    if is_hashes_file(new_hashes_file):
+        # only lookups by hash are needed: binary search in mapped file
+        with HashesFile(new_hashes_file) as new_hashes:
+            changed_dirs = get_changed_dirs(old_hashes=old_hashes, new_merkle=new_hashes.merkle)
+            compare_hashes(old_hashes=old_hashes, new_hashes=new_hashes, dir_names=changed_dirs)
+    else:
+        new_hashes = Hashes.load(new_hashes_file)
+        changed_dirs = get_changed_dirs(old_hashes=old_hashes, new_merkle=new_hashes.get_merkle())
+        compare_hashes(old_hashes=old_hashes, new_hashes=new_hashes, dir_names=changed_dirs)
+
+
+def load_sketches(hashes_file: str) -> library.minhash.DirSketches:
+    # built once per snapshot, next to hashes file
+    sketches_file = f'{hashes_file}.sketches.npz'
+    if os.path.exists(sketches_file) and os.path.getmtime(sketches_file) >= os.path.getmtime(hashes_file):
+        log.info(f'Loading sketches from {sketches_file}')
+        return library.minhash.DirSketches.load(sketches_file)
+
+    clean_tree = Hashes.load(hashes_file).clean_tree
+    sketches = library.minhash.DirSketches.from_tree({
+        dir_name: hashes.values()
+        for dir_name, hashes in clean_tree.items()
+    })
+    sketches.save(sketches_file)
+    return sketches
+
+
+def compare_sketches(
+    *,
+    old_sketches: library.minhash.DirSketches,
+    new_sketches: library.minhash.DirSketches,
+    limit: int = 3,
+):
+    missing_count = 0
+    for index, old_dir in enumerate(old_sketches.names):
+        files_count = int(old_sketches.counts[index])
+        matches = new_sketches.find_similar(old_sketches, index)
+        if not matches:
+            missing_count += 1
+            log.info(f'No similar dirs for {old_dir!r} ({files_count} files)')
+            continue
+
+        examples = '\n'.join(
+            f'  {match.name!r}: containment {match.containment:.2f}, jaccard {match.jaccard:.2f}'
+            f'{"" if match.exact else " (estimated)"}'
+            for match in matches[:limit]
+        )
+        log.info(f'Similar dirs for {old_dir!r} ({files_count} files):\n{examples}')
+
+    log.info(f'{missing_count} of {len(old_sketches.names)} old dirs have no similar new dirs')
+
+
+def compare_roots(*, old_root: str, new_root: str):
+    finder = library.duplicates.DuplicateFinder()
+    finder.add_dir(old_root)
+    finder.add_dir(new_root)
+    compare_hashes(
+        old_hashes=hashes_from_keys(old_root, finder.keys),
+        new_hashes=hashes_from_keys(new_root, finder.keys),
+    )
+
+
+def get_backup_dir_name(old_dir: str) -> str:
+    baseDir = os.path.basename(old_dir)
+    if len([c for c in baseDir if c.isdigit()]) < 8:
+        baseDir = '_'.join(old_dir.split(os.sep)[-2:])
+    return baseDir
+
+
+def compare_hashes(
+    *,
+    old_hashes: 'Hashes',
+    new_hashes: 'Hashes',
+    dir_names: Optional[List[str]] = None,
+) -> Dict[str, List[str]]:
+    missing = {}
+    clean_tree = old_hashes.clean_tree
+    if dir_names is not None:
+        clean_tree = {dir_name: clean_tree[dir_name] for dir_name in sorted(dir_names) if dir_name in clean_tree}
+
+    for oldDir, oldHashes in clean_tree.items():
         relevant_dirs = collections.defaultdict(int)
         for fileName, fileHash in oldHashes.items():
             fileDirs = new_hashes.dirs_by_hash[fileHash]
@@ -187,28 +377,108 @@ def compare(*, old_hashes_file: str, new_hashes_file: str):
                 f'file examples (up to {limit}):\n{visualize_states(exists)}'
                 f'{splitter.join(examples[:limit])}'
             )
-            baseDir = os.path.basename(oldDir)
-            if len([c for c in baseDir if c.isdigit()]) < 8:
-                baseDir = '_'.join(oldDir.split(os.sep)[-2:])
-
-            dstDir = f'{library.files.Location.Home}/Toshiba_save/Photo/{baseDir}'
+            missing[oldDir] = missingFiles
+            dstDir = f'{library.files.Location.Home}/Toshiba_save/Photo/{get_backup_dir_name(oldDir)}'
             log.debug(f'''Cmd to copy them all:
 mkdir '{dstDir}'
 cp '{os.path.join(old_hashes.root, oldDir)}'/{{{",".join(missingFiles)}}} '{dstDir}/'
 ''')
 
+    return missing
+
+
+def copy_missing(*, old_hashes_file: str, new_hashes_file: str, dst_root: str, workers: int = library.copier.WORKERS):
+    # copied files are hashed on the fly, new hashes file gets those of them which are under its root
+    old_hashes = Hashes.load(old_hashes_file)
+    new_hashes = Hashes.load(new_hashes_file)
+    changed_dirs = get_changed_dirs(old_hashes=old_hashes, new_merkle=new_hashes.get_merkle())
+    missing = compare_hashes(old_hashes=old_hashes, new_hashes=new_hashes, dir_names=changed_dirs)
+
+    jobs = [
+        library.copier.CopyJob(
+            src=os.path.join(old_hashes.root, old_dir, name),
+            dst=os.path.join(dst_root, get_backup_dir_name(old_dir), name),
+            md5=old_hashes.tree[old_dir][name],
+        )
+        for old_dir, names in missing.items()
+        for name in names
+    ]
+
+    added_count = 0
+
+    def add_to_new_hashes(result: library.copier.CopyResult):
+        nonlocal added_count
+        if result.dst.startswith(new_hashes.root + os.sep):
+            sub_root, name = os.path.split(result.dst)
+            localized_root = localize(new_hashes.root, sub_root)
+            new_hashes.tree.setdefault(localized_root, {})[name] = result.md5
+            new_hashes.stats.setdefault(localized_root, {})[name] = [result.size, result.mtime_ns]
+            added_count += 1
+
+    try:
+        library.copier.copy_files(jobs, workers=workers, on_copied=add_to_new_hashes)
+    finally:
+        if added_count:
+            log.info(f'Adding {added_count} copied files to {new_hashes_file}')
+            new_hashes.merkle = merkle_digests(new_hashes.root, new_hashes.tree)
+            if is_hashes_file(new_hashes_file):
+                new_hashes.save_binary(new_hashes_file)
+            else:
+                new_hashes.save(new_hashes_file)
+
 
 def run_compare(args):
-    compare(
-        old_hashes_file=defaults.GetJsonLocation(Mode.Old),
-        new_hashes_file=defaults.GetJsonLocation(Mode.Old),
-    )
+    if args.old_root and args.new_root:
+        compare_roots(old_root=args.old_root, new_root=args.new_root)
+        return
+
+    old_hashes_file = args.old_hashes_file or defaults.GetJsonLocation(Mode.Old)
+    new_hashes_file = args.new_hashes_file or defaults.GetJsonLocation(Mode.New)
+    if args.copy_to:
+        copy_missing(
+            old_hashes_file=old_hashes_file,
+            new_hashes_file=new_hashes_file,
+            dst_root=args.copy_to,
+            workers=args.copy_workers,
+        )
+    elif args.sketch:
+        compare_sketches(
+            old_sketches=load_sketches(old_hashes_file),
+            new_sketches=load_sketches(new_hashes_file),
+        )
+    else:
+        compare(old_hashes_file=old_hashes_file, new_hashes_file=new_hashes_file)
+
+
+def run_convert(args):
+    hashes = Hashes.load(args.src)
+    if args.binary:
+        hashes.save_binary(args.dst)
+    else:
+        hashes.save(args.dst)
 
 
 def populate_calc_parser(parser):
     parser.add_argument('--mode', help='Choose mode', choices=[mode.value for mode in Mode], required=True, type=Mode)
+    parser.add_argument('--root', help='Root dir to hash instead of default one for mode')
+    parser.add_argument('--hashes-file', help='Hashes file to update instead of default one for mode')
+    parser.add_argument('--workers', help='Threads to hash changed files', type=int, default=CALC_WORKERS)
     parser.set_defaults(func=run_calc)
 
 
 def populate_compare_parser(parser):
+    parser.add_argument('--old-root', help='Compare dirs directly, without hashes files: old dir')
+    parser.add_argument('--new-root', help='Compare dirs directly, without hashes files: new dir')
+    parser.add_argument('--old-hashes-file', help='Old hashes file, json or binary')
+    parser.add_argument('--new-hashes-file', help='New hashes file, json or binary')
+    parser.add_argument('--sketch', help='Match dirs by MinHash sketches instead of per file lookups', action='store_true')
+    parser.add_argument('--copy-to', help='Copy missing files to this dir, verifying them against old hashes')
+    parser.add_argument('--copy-workers', help='Parallel copies, one per pair of devices', type=int, default=library.copier.WORKERS)
     parser.set_defaults(func=run_compare)
+
+
+def populate_convert_parser(parser):
+    parser.add_argument('--src', help='Hashes file to read, json or binary', required=True)
+    parser.add_argument('--dst', help='Hashes file to write', required=True)
+    parser.add_argument('--binary', help='Write compact binary format instead of json', action='store_true')
+    parser.set_defaults(func=run_convert)
@@ -0,0 +1,159 @@
+import collections
+import datetime
+import os
+import stat
+
+from dataclasses import dataclass
+from typing import List
+
+import library.files
+from library.duplicates import DuplicateFinder, same_bytes
+from library.mover import MoveJournal
+
+import logging
+log = logging.getLogger(__name__)
+
+
+JOURNAL_PREFIX = 'dedupe-link'
+
+
+def get_journal_name(now: datetime.datetime) -> str:
+    # one undo journal per applied run, earlier ones are kept for rollback
+    return f'{JOURNAL_PREFIX}-{now.strftime("%Y%m%d-%H%M%S")}.jsonl'
+
+
+@dataclass
+class Link:
+    target: str
+    path: str
+    size: int
+    mtime_ns: int
+    mode: int
+    inode: int
+    nlink: int
+    target_size: int
+    target_mtime_ns: int
+
+
+def get_groups_from_json(json_file: str) -> List[List[str]]:
+    paths_by_md5 = collections.defaultdict(list)
+    for row in library.files.read_json_rows(json_file):
+        paths_by_md5[row['md5sum']].append(row['path'])
+    return sorted(sorted(paths) for paths in paths_by_md5.values() if len(paths) >= 2)
+
+
+def plan_links(groups: List[List[str]]) -> List[Link]:
+    # In each group of same digest files: one target per device, the file with most links already.
+    # Duplicates are confirmed byte-for-byte, files already linked to target are skipped.
+    links = []
+    other_devices_count, mismatch_count, missing_count = 0, 0, 0
+    for group in groups:
+        files_by_device = collections.defaultdict(list)
+        for path in group:
+            try:
+                path_stat = os.stat(path, follow_symlinks=False)
+            except FileNotFoundError:
+                log.warning(f'Missing file: {path!r}')
+                missing_count += 1
+                continue
+            if stat.S_ISREG(path_stat.st_mode):
+                files_by_device[path_stat.st_dev].append((path, path_stat))
+        if len(files_by_device) > 1:
+            other_devices_count += len(files_by_device) - 1
+
+        for files in files_by_device.values():
+            files.sort(key=lambda item: (-item[1].st_nlink, item[0]))
+            target, target_stat = files[0]
+            for path, path_stat in files[1:]:
+                if path_stat.st_ino == target_stat.st_ino:
+                    continue
+                if not same_bytes(target, path):
+                    log.warning(f'Same digest, but different content: {target!r} and {path!r}')
+                    mismatch_count += 1
+                    continue
+                links.append(Link(
+                    target=target,
+                    path=path,
+                    size=path_stat.st_size,
+                    mtime_ns=path_stat.st_mtime_ns,
+                    mode=stat.S_IMODE(path_stat.st_mode),
+                    inode=path_stat.st_ino,
+                    nlink=path_stat.st_nlink,
+                    target_size=target_stat.st_size,
+                    target_mtime_ns=target_stat.st_mtime_ns,
+                ))
+
+    if other_devices_count:
+        log.info(f'Skipped {other_devices_count} copies on other devices than their targets')
+    if mismatch_count:
+        log.warning(f'Skipped {mismatch_count} files with same digest and different content')
+    if missing_count:
+        log.warning(f'Skipped {missing_count} missing files, moved or deleted since hashing')
+    return links
+
+
+def get_reclaimed_bytes(links: List[Link]) -> int:
+    # data is freed only when all links of an inode are replaced
+    links_by_inode = collections.defaultdict(list)
+    for link in links:
+        links_by_inode[link.inode].append(link)
+    return sum(
+        inode_links[0].size
+        for inode_links in links_by_inode.values()
+        if len(inode_links) == inode_links[0].nlink
+    )
+
+
+def log_report(links: List[Link]):
+    links_by_target = collections.defaultdict(list)
+    for link in links:
+        links_by_target[link.target].append(link)
+    for target, target_links in sorted(links_by_target.items()):
+        paths = '\n'.join(f'  {link.path!r}' for link in target_links)
+        log.debug(f'Link to {target!r}:\n{paths}')
+
+    reclaimed_bytes = get_reclaimed_bytes(links)
+    log.info(
+        f'Could link {len(links)} duplicates to {len(links_by_target)} files '
+        f'and reclaim {reclaimed_bytes} bytes ({reclaimed_bytes / 2 ** 20:.1f} MB)'
+    )
+
+
+def run_dedupe_link(args):
+    if args.dir:
+        finder = DuplicateFinder()
+        for dirname in args.dir:
+            finder.add_dir(dirname)
+        groups = finder.groups
+    else:
+        log.info(f'Reading {args.json_file!r}')
+        groups = get_groups_from_json(args.json_file)
+
+    links = plan_links(groups)
+    log_report(links)
+
+    if args.apply and links:
+        operations = [
+            {
+                'op': 'link',
+                'path': link.path,
+                'target': link.target,
+                'size': link.size,
+                'mtime_ns': link.mtime_ns,
+                'mode': link.mode,
+                'target_size': link.target_size,
+                'target_mtime_ns': link.target_mtime_ns,
+            }
+            for link in links
+        ]
+        journal_file = args.journal or get_journal_name(datetime.datetime.now())
+        MoveJournal.create(journal_file, operations).replay(keep=True)
+        log.info(f'To undo: photo-moves-journal --journal {journal_file!r} --rollback')
+
+
+def populate_parser(parser):
+    parser.add_argument('--json-file', help='Json file with md5sums of photos', default='data.json')
+    parser.add_argument('--dir', help='Scan dir instead of json file, reads only files with same sizes', action='append', default=[])
+    parser.add_argument('--journal', help=f'Undo journal for applied links, new {JOURNAL_PREFIX}-<time>.jsonl by default')
+    parser.add_argument('--apply', help='Replace duplicates with hardlinks, only report otherwise', action='store_true')
+    parser.set_defaults(func=run_dedupe_link)
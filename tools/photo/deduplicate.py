@@ -1,9 +1,12 @@
+import array
 import collections
-import json
+import heapq
 import os
 
-from typing import DefaultDict, List, Dict, Tuple
+from typing import Dict, List, Optional, Set, Tuple, Union
 
+import library.files
+from library.duplicates import DuplicateFinder
 from library.photo.photo_file import PhotoInfo
 
 import logging
@@ -14,42 +17,113 @@ SHARE = 0.7
 TOTAL = 10
 
 
-class Stats:
-    def __init__(self):
-        self.photos_by_path: Dict[str, PhotoInfo] = {}
-        self.photos_by_md5sum: DefaultDict[str, List[PhotoInfo]] = collections.defaultdict(list)
-        self.file_counters = collections.defaultdict(int)
-        self.collision_counters = collections.defaultdict(int)
-        self.matched_dirs: DefaultDict[Tuple[str, str], int] = collections.defaultdict(int)
+Digest = Union[bytes, str]
 
-    def add_photo(self, photo_info: PhotoInfo):
-        if photo_info.path in self.photos_by_path:
-            raise RuntimeError()
 
-        self.photos_by_path[photo_info.path] = photo_info
+def compact_digest(md5sum: str) -> Digest:
+    if len(md5sum) == 32:
+        try:
+            return bytes.fromhex(md5sum)
+        except ValueError:
+            pass
+    return md5sum
 
-        dir_name = os.path.dirname(photo_info.path)
-        self.file_counters[dir_name] += 1
 
-        has_collisions = False
-        for same_photo in self.photos_by_md5sum[photo_info.md5sum]:
-            d_name = os.path.dirname(same_photo.path)
-            self.collision_counters[d_name] += 1
-            has_collisions = True
-            if dir_name < d_name:
-                key = (dir_name, d_name)
-            else:
-                key = (d_name, dir_name)
-            self.matched_dirs[key] += 1
+class Stats:
+    def __init__(self):
+        self._dir_ids: Dict[str, int] = {}
+        self.dir_names: List[str] = []
+        # basenames by dir id: checks double adds without keeping full paths, its size is the files count
+        self._basenames: List[Set[str]] = []
+        # digest -> dir id of a single copy, or ids of all copies in insertion order
+        self._dirs_by_digest: Dict[Digest, Union[int, array.array]] = {}
+        self._pair_matches: Optional[Dict[Tuple[int, int], int]] = None
+
+    def _get_dir_id(self, dir_name: str) -> int:
+        dir_id = self._dir_ids.get(dir_name)
+        if dir_id is None:
+            dir_id = len(self.dir_names)
+            self._dir_ids[dir_name] = dir_id
+            self.dir_names.append(dir_name)
+            self._basenames.append(set())
+        return dir_id
 
-        self.photos_by_md5sum[photo_info.md5sum].append(photo_info)
-        if has_collisions:
-            self.collision_counters[dir_name] += 1
+    def add_photo(self, photo_info: PhotoInfo):
+        dir_name, basename = os.path.split(photo_info.path)
+        dir_id = self._get_dir_id(dir_name)
+        basenames = self._basenames[dir_id]
+        if basename in basenames:
+            raise RuntimeError(f'Photo {photo_info.path!r} is added twice')
+        basenames.add(basename)
+        self._pair_matches = None
+
+        digest = compact_digest(photo_info.md5sum)
+        dir_ids = self._dirs_by_digest.get(digest)
+        if dir_ids is None:
+            self._dirs_by_digest[digest] = dir_id
+        elif isinstance(dir_ids, int):
+            self._dirs_by_digest[digest] = array.array('I', [dir_ids, dir_id])
+        else:
+            dir_ids.append(dir_id)
+
+    @property
+    def file_counters(self) -> Dict[str, int]:
+        return {dir_name: len(basenames) for dir_name, basenames in zip(self.dir_names, self._basenames)}
+
+    @property
+    def collision_counters(self) -> Dict[str, int]:
+        counters = collections.defaultdict(int)
+        for dir_ids in self._dirs_by_digest.values():
+            if isinstance(dir_ids, int):
+                continue
+            # every copy collides with all later copies and, unless it is the first one, with itself
+            for index, dir_id in enumerate(dir_ids):
+                counters[self.dir_names[dir_id]] += len(dir_ids) - 1 - index + (1 if index else 0)
+        return dict(counters)
+
+    def get_pair_matches(self) -> Dict[Tuple[int, int], int]:
+        # Number of same-digest photo pairs for each pair of dir ids, ordered by dir name
+        if self._pair_matches is not None:
+            return self._pair_matches
+
+        pair_matches = collections.Counter()
+        for dir_ids in self._dirs_by_digest.values():
+            if isinstance(dir_ids, int):
+                continue
+
+            counts = sorted(collections.Counter(dir_ids).items(), key=lambda item: self.dir_names[item[0]])
+            for index, (first_id, first_count) in enumerate(counts):
+                if first_count > 1:
+                    pair_matches[(first_id, first_id)] += first_count * (first_count - 1) // 2
+                for second_id, second_count in counts[index + 1:]:
+                    pair_matches[(first_id, second_id)] += first_count * second_count
+
+        self._pair_matches = dict(pair_matches)
+        return self._pair_matches
+
+    @property
+    def matched_dirs(self) -> Dict[Tuple[str, str], int]:
+        return {
+            (self.dir_names[first_id], self.dir_names[second_id]): matches
+            for (first_id, second_id), matches in self.get_pair_matches().items()
+        }
+
+    def most_similar_dirs(self, dir_name: str, k: int = 10) -> List[Tuple[str, int]]:
+        dir_id = self._dir_ids[dir_name]
+        candidates = []
+        for (first_id, second_id), matches in self.get_pair_matches().items():
+            if first_id == dir_id and second_id != dir_id:
+                candidates.append((matches, self.dir_names[second_id]))
+            elif second_id == dir_id and first_id != dir_id:
+                candidates.append((matches, self.dir_names[first_id]))
+
+        return [(name, matches) for matches, name in heapq.nlargest(k, candidates)]
 
     def process(self):
-        for (first_dir, second_dir), matches in self.matched_dirs.items():
-            first_count = self.file_counters[first_dir]
-            second_count = self.file_counters[second_dir]
+        for (first_id, second_id), matches in sorted(self.get_pair_matches().items()):
+            first_dir, second_dir = self.dir_names[first_id], self.dir_names[second_id]
+            first_count = len(self._basenames[first_id])
+            second_count = len(self._basenames[second_id])
             first_share = matches / first_count
             second_share = matches / second_count
             if (first_share >= SHARE or second_share >= SHARE or matches >= TOTAL):
@@ -72,17 +146,22 @@ class Stats:
 
 
 def run_deduplicate(args):
-    json_file = args.json_file
-    log.info(f'Reading {json_file!r}')
-    with open(json_file) as f:
-        photo_files_json = json.load(f)
-
     stats = Stats()
-    for row in photo_files_json:
-        stats.add_photo(PhotoInfo.from_dict(row))
+    if args.dir:
+        finder = DuplicateFinder()
+        for dirname in args.dir:
+            finder.add_dir(dirname)
+        for path, key in sorted(finder.keys.items()):
+            stats.add_photo(PhotoInfo(path=path, md5sum=key, timestamps=[]))
+    else:
+        json_file = args.json_file
+        log.info(f'Reading {json_file!r}')
+        for row in library.files.read_json_rows(json_file):
+            stats.add_photo(PhotoInfo.from_dict(row))
     stats.process()
 
 
 def populate_parser(parser):
     parser.add_argument('--json-file', help='Json file to store all data', default='data.json')
+    parser.add_argument('--dir', help='Scan dir instead of json file, reads only files with same sizes', action='append', default=[])
     parser.set_defaults(func=run_deduplicate)
@@ -0,0 +1,256 @@
+import collections
+import hashlib
+import mmap
+import os
+import struct
+
+from functools import cached_property
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import logging
+log = logging.getLogger(__name__)
+
+
+# Layout, little-endian, sections aligned to 8 bytes:
+#   header
+#   string tables: root, dir names, file names: (count + 1) uint64 offsets and utf-8 blob
+#   merkle digests: string table of dir paths and 16-byte md5 for each
+#   records sorted by digest: 16-byte md5, dir id, name id[, size, mtime_ns]
+MAGIC = b'TRHASH02'
+HEADER = struct.Struct('<8sIIIIQQQQQQ')
+HAS_STATS = 1
+RECORD = struct.Struct('<16sII')
+RECORD_WITH_STATS = struct.Struct('<16sIIQq')
+DIGEST_SIZE = 16
+
+
+def is_hashes_file(filename: str) -> bool:
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _pad(data: bytes) -> bytes:
+    return data + b'\0' * (-len(data) % 8)
+
+
+def _pack_strings(strings: List[str]) -> bytes:
+    blobs = [string.encode('utf-8') for string in strings]
+    offsets = [0]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    return _pad(struct.pack(f'<{len(offsets)}Q', *offsets) + b''.join(blobs))
+
+
+def _to_digest(file_hash: str, path: str) -> bytes:
+    try:
+        digest = bytes.fromhex(file_hash)
+    except ValueError:
+        digest = b''
+    if len(digest) != DIGEST_SIZE:
+        raise ValueError(f'Not a md5 hex digest: {file_hash!r} for {path!r}')
+    return digest
+
+
+def _merkle_path(root: str, dir_name: str) -> str:
+    # files in root itself are stored under root path, see localize
+    return '' if dir_name == root else dir_name
+
+
+def merkle_digests(root: str, tree: Dict[str, Dict[str, str]]) -> Dict[str, str]:
+    # Digest of dir covers names and digests of its files and subdirs: equal digests mean equal subtrees.
+    # Keys are '/'-separated paths, '' for root, intermediate dirs without files are included.
+    entries = collections.defaultdict(list)
+    for dir_name, hashes in tree.items():
+        path = _merkle_path(root, dir_name)
+        entries[path].extend(f'f\0{name}\0{file_hash}\0' for name, file_hash in hashes.items())
+        while path:
+            path = path.rpartition('/')[0]
+            if path in entries:
+                break
+            entries[path]
+
+    digests = {}
+    for path in sorted(entries, key=lambda path: path.count('/') if path else -1, reverse=True):
+        digests[path] = hashlib.md5(''.join(sorted(entries[path])).encode('utf-8')).hexdigest()
+        if path:
+            parent, _, name = path.rpartition('/')
+            entries[parent].append(f'd\0{name}\0{digests[path]}\0')
+
+    return digests
+
+
+def write_hashes_file(
+    filename: str,
+    *,
+    root: str,
+    tree: Dict[str, Dict[str, str]],
+    stats: Optional[Dict[str, Dict[str, List[int]]]] = None,
+    merkle: Optional[Dict[str, str]] = None,
+):
+    merkle = merkle or merkle_digests(root, tree)
+    merkle_paths = sorted(merkle)
+    dir_names = sorted(tree)
+    names = sorted({name for hashes in tree.values() for name in hashes})
+    name_ids = {name: index for index, name in enumerate(names)}
+
+    record = RECORD_WITH_STATS if stats else RECORD
+    records = []
+    for dir_id, dir_name in enumerate(dir_names):
+        dir_stats = stats.get(dir_name, {}) if stats else {}
+        for name, file_hash in tree[dir_name].items():
+            digest = _to_digest(file_hash, f'{dir_name}/{name}')
+            if stats:
+                size, mtime_ns = dir_stats.get(name, (0, 0))
+                records.append(record.pack(digest, dir_id, name_ids[name], size, mtime_ns))
+            else:
+                records.append(record.pack(digest, dir_id, name_ids[name]))
+    records.sort()
+
+    sections = [
+        _pack_strings([root]),
+        _pack_strings(dir_names),
+        _pack_strings(names),
+        _pack_strings(merkle_paths) + _pad(b''.join(bytes.fromhex(merkle[path]) for path in merkle_paths)),
+    ]
+    offsets = []
+    offset = HEADER.size
+    for section in sections:
+        offsets.append(offset)
+        offset += len(section)
+
+    header = HEADER.pack(
+        MAGIC,
+        HAS_STATS if stats else 0,
+        len(dir_names),
+        len(names),
+        len(merkle_paths),
+        len(records),
+        *offsets,
+        offset,
+    )
+
+    log.info(f'Saving {len(records)} hashes of {root} to {filename}')
+    tmp_filename = f'{filename}.tmp'
+    with open(tmp_filename, 'wb') as f:
+        f.write(header)
+        for section in sections:
+            f.write(section)
+        f.write(b''.join(records))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+
+
+class DirsByHash:
+    # same lookups as Hashes.dirs_by_hash, without building the dict
+    def __init__(self, hashes_file: 'HashesFile'):
+        self._hashes_file = hashes_file
+
+    def __getitem__(self, file_hash: str) -> List[str]:
+        return self._hashes_file.find_dirs(file_hash)
+
+
+class HashesFile:
+    def __init__(self, filename: str):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (
+            magic, flags, self._dirs_count, self._names_count, self._merkle_count, self._records_count,
+            root_offset, self._dirs_offset, self._names_offset, self._merkle_offset, self._records_offset,
+        ) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f'Not a hashes file: {filename!r}')
+
+        self.has_stats = bool(flags & HAS_STATS)
+        self._record = RECORD_WITH_STATS if self.has_stats else RECORD
+        self.root = self._get_string(root_offset, 1, 0)
+        self._dir_names = {}
+
+    def _get_string(self, table_offset: int, count: int, index: int) -> str:
+        start, finish = struct.unpack_from('<2Q', self._mm, table_offset + 8 * index)
+        blob_offset = table_offset + 8 * (count + 1)
+        return self._mm[blob_offset + start:blob_offset + finish].decode('utf-8')
+
+    def _get_dir_name(self, dir_id: int) -> str:
+        dir_name = self._dir_names.get(dir_id)
+        if dir_name is None:
+            dir_name = self._get_string(self._dirs_offset, self._dirs_count, dir_id)
+            self._dir_names[dir_id] = dir_name
+        return dir_name
+
+    def _get_name(self, name_id: int) -> str:
+        return self._get_string(self._names_offset, self._names_count, name_id)
+
+    def _get_digest(self, index: int) -> bytes:
+        offset = self._records_offset + index * self._record.size
+        return self._mm[offset:offset + DIGEST_SIZE]
+
+    def __len__(self) -> int:
+        return self._records_count
+
+    def find_dirs(self, file_hash: str) -> List[str]:
+        try:
+            digest = bytes.fromhex(file_hash)
+        except ValueError:
+            return []
+
+        low, high = 0, self._records_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._get_digest(middle) < digest:
+                low = middle + 1
+            else:
+                high = middle
+
+        dirs = []
+        while low < self._records_count and self._get_digest(low) == digest:
+            _, dir_id, _ = RECORD.unpack_from(self._mm, self._records_offset + low * self._record.size)
+            dirs.append(self._get_dir_name(dir_id))
+            low += 1
+        return dirs
+
+    def _string_table_size(self, table_offset: int, count: int) -> int:
+        (blob_size,) = struct.unpack_from('<Q', self._mm, table_offset + 8 * count)
+        size = 8 * (count + 1) + blob_size
+        return size + (-size % 8)
+
+    @cached_property
+    def merkle(self) -> Dict[str, str]:
+        count = self._merkle_count
+        digests_offset = self._merkle_offset + self._string_table_size(self._merkle_offset, count)
+        return {
+            self._get_string(self._merkle_offset, count, index): self._mm[offset:offset + DIGEST_SIZE].hex()
+            for index, offset in enumerate(range(digests_offset, digests_offset + DIGEST_SIZE * count, DIGEST_SIZE))
+        }
+
+    @cached_property
+    def dirs_by_hash(self) -> DirsByHash:
+        return DirsByHash(self)
+
+    def iter_records(self) -> Iterator[Tuple[str, str, str, Optional[Tuple[int, int]]]]:
+        # unpacked in place: slicing mmap would copy all records
+        record_size = self._record.size
+        for offset in range(self._records_offset, self._records_offset + self._records_count * record_size, record_size):
+            values = self._record.unpack_from(self._mm, offset)
+            digest, dir_id, name_id = values[:3]
+            file_stats = tuple(values[3:]) if self.has_stats else None
+            yield self._get_dir_name(dir_id), self._get_name(name_id), digest.hex(), file_stats
+
+    def to_dict(self) -> dict:
+        tree, stats = {}, {}
+        for dir_name, name, file_hash, file_stats in self.iter_records():
+            tree.setdefault(dir_name, {})[name] = file_hash
+            if file_stats:
+                stats.setdefault(dir_name, {})[name] = list(file_stats)
+        return {'root': self.root, 'tree': tree, 'stats': stats, 'merkle': self.merkle}
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,19 @@
+from library.mover import MoveJournal
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def run_journal(args):
+    journal = MoveJournal(args.journal)
+    log.info(f'Journal {args.journal!r}: {len(journal.operations)} operations, {len(journal.done)} applied, {len(journal.undone)} reverted')
+    if args.rollback:
+        journal.rollback()
+    else:
+        journal.replay()
+
+
+def populate_parser(parser):
+    parser.add_argument('--journal', help='Journal file of photo-rename, airdrop-move or photo-dedupe-link', required=True)
+    parser.add_argument('--rollback', help='Revert applied operations instead of finishing them', action='store_true')
+    parser.set_defaults(func=run_journal)
@@ -1,9 +1,12 @@
 import collections
 import os
 
+from typing import List
+
 import library.files
-from library.mover import FileMover
-from tools.photo.calculate import PhotoFile
+from library.mover import JOURNAL_NAME, FileMover
+from library.photo.catalog import open_catalog
+from library.photo.photo_file import PREFETCH_WORKERS, PhotoFile, prefetch_photo_files
 
 import logging
 log = logging.getLogger(__name__)
@@ -17,20 +20,7 @@ def file_is_ok(filename: str) -> bool:
     return True
 
 
-def rename_dir(
-    *,
-    dirname: str,
-    do_move: bool,
-):
-    photo_files = [
-        PhotoFile(file)
-        for file in library.files.walk(dirname, extensions=['JPG', 'jpg'])
-        if file_is_ok(file)
-    ]
-    photo_files.sort(key=lambda x: x.Path)
-
-    log.info(f'Checking {len(photo_files)} photo files in {dirname}')
-
+def get_file_mover(photo_files: List[PhotoFile]) -> FileMover:
     photo_files_by_timestamp = collections.defaultdict(list)
     for photo_file in photo_files:
         if photo_file.timestamp:
@@ -57,22 +47,61 @@ def rename_dir(
             dst = os.path.join(os.path.dirname(photo.Path), basename)
             file_mover.add(photo.Path, dst)
 
+    return file_mover
+
+
+def rename_dir(
+    *,
+    dirname: str,
+    do_move: bool,
+    catalog_file: str = None,
+    plan_file: str = None,
+    workers: int = PREFETCH_WORKERS,
+    journal_file: str = None,
+):
+    if do_move and plan_file and os.path.exists(plan_file):
+        file_mover = FileMover.load_plan(plan_file, dirname)
+    else:
+        filenames = sorted(
+            file
+            for file in library.files.walk(dirname, extensions=['JPG', 'jpg'])
+            if file_is_ok(file)
+        )
+        log.info(f'Checking {len(filenames)} photo files in {dirname}')
+
+        with open_catalog(catalog_file) as catalog:
+            photo_files = prefetch_photo_files(filenames, attribute='timestamp', catalog=catalog, workers=workers)
+
+        file_mover = get_file_mover(photo_files)
+        if plan_file:
+            file_mover.save_plan(plan_file, dirname)
+
     file_mover.get_src_dirnames()
     file_mover.get_dst_dirnames()
 
-    for src, dst in file_mover.get_mv_files(with_log=True):
-        if do_move:
-            os.rename(src, dst)
+    if do_move:
+        file_mover.execute(journal_file or os.path.join(dirname, JOURNAL_NAME))
+    else:
+        for src, dst in file_mover.get_mv_files(with_log=True):
+            pass
 
 
 def run_rename(args):
     rename_dir(
         dirname=args.dir,
         do_move=args.move,
+        catalog_file=args.catalog,
+        plan_file=args.plan,
+        workers=args.workers,
+        journal_file=args.journal,
     )
 
 
 def populate_parser(parser):
     parser.add_argument('--dir', help='Dir to rename', required=True)
     parser.add_argument('--move', help='Do move', action='store_true')
+    parser.add_argument('--catalog', help='Sqlite catalog to reuse metadata of unchanged files')
+    parser.add_argument('--plan', help='Json file to save move plan to, existing plan is applied with --move without reading photos')
+    parser.add_argument('--workers', help='Threads to read photos in parallel', type=int, default=PREFETCH_WORKERS)
+    parser.add_argument('--journal', help=f'Journal file to recover interrupted moves, default is {JOURNAL_NAME} in renamed dir')
     parser.set_defaults(func=run_rename)
@@ -0,0 +1,110 @@
+import collections
+import concurrent.futures
+
+from typing import Dict, List, Optional
+
+from library.photo.catalog import CatalogEntry, PhotoCatalog, open_catalog
+from library.photo.phash import BKTree, hamming_distance
+from library.photo.photo_file import PhotoFile
+from tools.photo.calculate import get_photo_filenames
+
+import logging
+log = logging.getLogger(__name__)
+
+
+DEFAULT_DISTANCE = 6
+
+
+def _get_perceptual_hash(filename: str) -> CatalogEntry:
+    photo_file = PhotoFile(filename)
+    photo_file.PerceptualHash
+    return photo_file.CatalogEntry
+
+
+def get_perceptual_hashes(
+    filenames: List[str],
+    *,
+    catalog: Optional[PhotoCatalog] = None,
+    workers: int = 0,
+) -> Dict[str, Optional[int]]:
+    hashes = {}
+    missing = []
+    for filename in filenames:
+        photo_file = PhotoFile(filename, catalog=catalog)
+        if workers > 1 and 'phash' not in photo_file.CatalogEntry.values:
+            missing.append(filename)
+        else:
+            hashes[filename] = photo_file.PerceptualHash
+
+    if missing:
+        log.info(f'Hashing {len(missing)} files with {workers} workers')
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            for entry in executor.map(_get_perceptual_hash, missing, chunksize=16):
+                if catalog is not None:
+                    catalog.merge(entry)
+                hashes[entry.path] = entry.values['phash']
+
+    return hashes
+
+
+def find_similar(hashes: Dict[str, Optional[int]], max_distance: int) -> List[List[str]]:
+    tree = BKTree()
+    for filename, value in sorted(hashes.items()):
+        if value is not None:
+            tree.add(value, filename)
+    log.info(f'Searching among {tree.size} hashes within distance {max_distance}')
+
+    parents = {}
+
+    def find(filename: str) -> str:
+        while parents.get(filename, filename) != filename:
+            filename = parents[filename]
+        return filename
+
+    for filename, value in sorted(hashes.items()):
+        if value is None:
+            continue
+        for _, other in tree.search(value, max_distance):
+            first, second = sorted([find(filename), find(other)])
+            if first != second:
+                parents[second] = first
+
+    groups = collections.defaultdict(list)
+    for filename in parents:
+        groups[find(filename)].append(filename)
+
+    return sorted(
+        sorted(set(filenames) | {root})
+        for root, filenames in groups.items()
+    )
+
+
+def run_similar(args):
+    filenames = get_photo_filenames(
+        dirnames=args.dir,
+        filenames=args.file,
+        skip_paths=args.skip,
+    )
+    with open_catalog(args.catalog) as catalog:
+        hashes = get_perceptual_hashes(filenames, catalog=catalog, workers=args.workers)
+
+    groups = find_similar(hashes, args.distance)
+    for group in groups:
+        first = group[0]
+        lines = [f'  {first}'] + [
+            f'  {filename} (distance {hamming_distance(hashes[first], hashes[filename])})'
+            for filename in group[1:]
+        ]
+        log.info('Similar photos:\n' + '\n'.join(lines))
+
+    log.info(f'Found {len(groups)} groups of similar photos among {len(hashes)} files')
+
+
+def populate_parser(parser):
+    parser.add_argument('--dir', help='Add dir to search', action='append', default=[])
+    parser.add_argument('--skip', help='Exclude paths from search', action='append', default=[])
+    parser.add_argument('--file', help='Add file to search', action='append', default=[])
+    parser.add_argument('--distance', help='Max Hamming distance of 64-bit hashes', type=int, default=DEFAULT_DISTANCE)
+    parser.add_argument('--catalog', help='Sqlite catalog to cache hashes of unchanged files')
+    parser.add_argument('--workers', help='Processes to hash files in parallel', type=int, default=0)
+    parser.set_defaults(func=run_similar)
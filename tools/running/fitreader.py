@@ -1,9 +1,9 @@
 import fitparse
 import datetime
 
-from typing import Optional
+from typing import Optional, Tuple
 from tools.running.track import Track
-from tools.running import trackpoint
+from tools.running.track_columns import TrackColumns
 
 import logging
 log = logging.getLogger(__name__)
@@ -18,7 +18,8 @@ def __from_semicircles(value: float) -> float:
     return float(value) * 180 / (2 ** 31)
 
 
-def get_point(values: dict) -> trackpoint.TrackPoint:
+def get_point_values(values: dict) -> Tuple[Optional[float], ...]:
+    # in TrackPoint fields order
     timestamp = int((values['timestamp'] - datetime.datetime(1970, 1, 1)).total_seconds())
     assert 1000000000 < timestamp < 2000000000
 
@@ -56,16 +57,7 @@ def get_point(values: dict) -> trackpoint.TrackPoint:
     if heart_rate is not None:
         heart_rate = int(heart_rate)
 
-    return trackpoint.TrackPoint(
-        longitude=longitude,
-        latitude=latitude,
-        altitude=altitude,
-        cadence=cadence,
-        heart_rate=heart_rate,
-        timestamp=timestamp,
-        speed=speed,
-        distance_m=distance_m,
-    )
+    return longitude, latitude, altitude, timestamp, cadence, heart_rate, distance_m, speed
 
 KNOWN_SHIFTS_HOURS = [0, 1, 2, 3, 4]
 KNOWN_SHIFTS = {datetime.timedelta(seconds=3600 * shift) for shift in KNOWN_SHIFTS_HOURS}
@@ -97,10 +89,10 @@ def read_fit_file(filename, raise_on_error=True) -> Track:
     activity_timezone = get_activity_timezone(
         activity_messages=list(fit_file.get_messages(ACTIVITY_MESSAGE)),
     )
-    points = [
-        get_point(message.get_values())
+    points = TrackColumns.from_rows(
+        get_point_values(message.get_values())
         for message in fit_file.get_messages(name=RECORD_MESSAGE)
-    ]
+    )
 
     track = Track(
         filename=filename,
@@ -2,19 +2,22 @@ from tools.running.fitreader import read_fit_file
 from tools.running.gpxwriter import save_gpx, to_gpx
 from tools.running.segment import Segment
 from tools.running import dirname
+from tools.running import geodesic
 from tools.running.track import Track
 
 import library.files
 
 import datetime
+import heapq
 import math
 import os
 import attr
+import numpy
 
 import logging
 log = logging.getLogger(__name__)
 
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 
 @attr.s
@@ -85,17 +88,115 @@ def clean(
     return new_track, broken_points
 
 
+class TrackCleaner:
+    # Same result as calling clean until nothing is removed. Decision for a point depends only on its previous ok
+    # point and its next point, so a pass rechecks only points whose next point was removed in previous pass
+    # and points after ones removed in this pass. Distances are exact and computed once per pair.
+    def __init__(self, track: Track, limits: Limits):
+        self.track = track
+        self.limits = limits
+        self._columns = track.columns[track.columns.ok]
+        self._latitudes = self._columns.latitude.tolist()
+        self._longitudes = self._columns.longitude.tolist()
+        self._timestamps = [int(timestamp) for timestamp in self._columns.timestamp.tolist()]
+        self._distances: Dict[Tuple[int, int], float] = {}
+
+    def _distance(self, first: int, second: int) -> float:
+        key = (first, second)
+        distance = self._distances.get(key)
+        if distance is None:
+            distance = geodesic.distance(
+                self._latitudes[first], self._longitudes[first],
+                self._latitudes[second], self._longitudes[second],
+            )
+            self._distances[key] = distance
+        return distance
+
+    def _speed(self, first: int, second: int) -> float:
+        # same as Segment.speed
+        duration = self._timestamps[second] - self._timestamps[first]
+        if duration > 0:
+            return 1000 * self._distance(first, second) / duration
+        return 0
+
+    def _get_reason(self, previous: Optional[int], index: int, next_index: Optional[int]) -> Optional[str]:
+        # same checks and order as in clean
+        limits = self.limits
+        if previous is not None and next_index is not None:
+            prev_distance, next_distance = self._distance(previous, index), self._distance(index, next_index)
+            triangle_rating = 1 - (self._distance(previous, next_index) / (prev_distance + next_distance))
+        else:
+            triangle_rating = None
+
+        if previous is not None and (self._speed(previous, index) >= limits.speed):
+            return f'speed: {self._speed(previous, index)} >= {limits.speed}'
+        elif triangle_rating and (triangle_rating >= limits.triangle):
+            return f'triangle: {triangle_rating} >= {limits.triangle}'
+        elif previous is not None and next_index is not None and (prev_distance >= limits.distance) and (next_distance >= limits.distance):
+            return f'two distances: {prev_distance}, {next_distance} >= {limits.distance}'
+        return None
+
+    def run(self) -> Tuple[Track, list]:
+        count = len(self._timestamps)
+        previous: List[Optional[int]] = [None] + list(range(count - 1))
+        following: List[Optional[int]] = list(range(1, count)) + [None]
+        alive_count = count
+        broken = []
+        to_check = list(range(count))
+        passes = 0
+        while True:
+            assert alive_count >= 3
+            passes += 1
+            heapq.heapify(to_check)
+            queued = set(to_check)
+            removed = {}  # removed point -> its previous ok point
+            removed_order = []
+            while to_check:
+                index = heapq.heappop(to_check)
+                previous_ok = removed.get(previous[index], previous[index])
+                next_index = following[index]
+                reason = self._get_reason(previous_ok, index, next_index)
+                if reason:
+                    log.info(f'{index}@{self._timestamps[index]} is broken by {reason}')
+                    removed[index] = previous_ok
+                    removed_order.append(index)
+                    if next_index is not None and next_index not in queued:
+                        heapq.heappush(to_check, next_index)
+                        queued.add(next_index)
+
+            if not removed:
+                break
+
+            next_changed = set()
+            for index in removed_order:
+                prev_index, next_index = previous[index], following[index]
+                if prev_index is not None:
+                    following[prev_index] = next_index
+                    next_changed.add(prev_index)
+                if next_index is not None:
+                    previous[next_index] = prev_index
+            to_check = list(next_changed - removed.keys())
+            alive_count -= len(removed)
+            broken += removed_order
+
+        log.info(f'Cleaned {self.track} in {passes} passes: {len(broken)} broken points, {len(self._distances)} distances')
+        is_ok = numpy.ones(count, dtype=bool)
+        is_ok[broken] = False
+        new_track = Track(
+            filename=self.track.filename,
+            points=self._columns[is_ok],
+            correct_crc=self.track.correct_crc,
+            activity_timezone=self.track.activity_timezone,
+        )
+        return new_track, [self._columns[index] for index in broken]
+
+
 def analyze_track(
     track: Track,
     limits: Limits,
 ) -> Tuple[Track, list]:
-    all_broken_points = []
-    while True:
-        log.info(f'Clean {track} with {limits}')
-        track, broken_points = clean(track, limits)
-        all_broken_points += broken_points
-        if not broken_points:
-            return track, all_broken_points
+    log.info(f'Clean {track} with {limits}')
+    return TrackCleaner(track, limits).run()
 
 
 def get_filenames(dirnames: List[str], flt):
@@ -127,6 +228,13 @@ def analyze(args):
     dirnames = list(get_dirnames(ACTIVE_YEARS, args.add_travel))
     filenames = list(get_filenames(dirnames, args.filter))
 
+    if args.snapshot:
+        snapshot = library.files.Snapshot.from_paths(filenames)
+        if os.path.exists(args.snapshot):
+            changes = snapshot.changes_since(library.files.Snapshot.load(args.snapshot))
+            # renamed files have the same content, no need to analyze them again
+            filenames = sorted(changes.added + changes.modified)
+
     log.info(f'Analyzing {len(filenames)} files')
     for filename in filenames:
         log.info(f'Analyzing {filename}')
@@ -155,9 +263,13 @@ def analyze(args):
         #         else:
         #             log.info(f'No points to save: {filename}')
 
+    if args.snapshot:
+        snapshot.save(args.snapshot)
+
 
 def populate_parser(parser):
     parser.add_argument('--filter', help='Find files containg this substring')
     parser.add_argument('--write', help='Write patched files', action='store_true')
     parser.add_argument('--add-travel', help='Add travel files', action='store_true')
+    parser.add_argument('--snapshot', help='Snapshot file: analyze only files changed since previous run')
     parser.set_defaults(func=analyze)
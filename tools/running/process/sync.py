@@ -1,6 +1,5 @@
 import library
 import os
-import shutil
 import time
 import webbrowser
 
@@ -47,6 +46,12 @@ class SrcFile:
         return os.path.getmtime(self.filename)
 
 
+def cache_md5sums(src_files: List[SrcFile]):
+    filenames = [src_file.filename for src_file in src_files]
+    for src_file, (_, md5sum) in zip(src_files, library.md5sum.md5sum_many(filenames)):
+        src_file.md5sum = md5sum
+
+
 def get_fit_files(dirname) -> List[SrcFile]:
     return [
         SrcFile(filename)
@@ -113,16 +118,18 @@ def unmount_disk(disk_name: str):
 
 def run_import(import_config: ImportConfig):
     device_files = get_fit_files(import_config.source_dir)
+    imported_files = wait_fit_files(import_config.destination_dir, sleep_time=import_config.sleep_time)
+    cache_md5sums(imported_files)
     processed_files = {
         fit_file.md5sum: fit_file
-        for fit_file in wait_fit_files(import_config.destination_dir, sleep_time=import_config.sleep_time)
+        for fit_file in imported_files
     }
 
     device_files.sort(key=lambda fit_file: fit_file.mtime)
-    for f in device_files:
-        f.md5sum  # cache
+    cache_md5sums(device_files)
 
     stats = Stats()
+    copy_jobs = []
     for src_file in device_files:
         track = tools.running.fitreader.read_fit_file(src_file.filename, raise_on_error=False)
         log.debug(f'Checking {track}')
@@ -135,7 +142,7 @@ def run_import(import_config: ImportConfig):
             if import_config.copy_files:
                 stats.copy += 1
                 log.info(f'Copy: {src_file.filename} -> {dst_file}')
-                shutil.copy(src_file.filename, dst_file)
+                copy_jobs.append(library.copier.CopyJob(src=src_file.filename, dst=dst_file, md5=src_file.md5sum))
             else:
                 stats.skip_copy += 1
                 log.info(f'Skip copy: {src_file.filename} -> {dst_file}')
@@ -150,6 +157,10 @@ def run_import(import_config: ImportConfig):
                 stats.success += 1
                 log.info(f'Success, could delete: {src_file.filename} -> {imported_file.filename}')
 
+    if copy_jobs:
+        # new copies are not deleted from device in the same run: only files found in local dir by md5 are
+        library.copier.copy_files(copy_jobs)
+
     log.info(f'Device files stats (of {stats.total}): {stats}')
 
     if import_config.open_browser and device_files:
@@ -1,6 +1,7 @@
-from typing import List, Optional
+from typing import List, Optional, Union
 import attr
 import datetime
+import numpy
 import os
 from functools import cached_property
 import re
@@ -8,8 +9,10 @@ import re
 import logging
 log = logging.getLogger(__name__)
 
+from tools.running import geodesic
 from tools.running import trackpoint
 from tools.running import segment
+from tools.running.track_columns import TrackColumns
 
 
 SEGMENT_DURATION_THRESHOLD = 10000
@@ -40,7 +43,7 @@ def speed_to_pace(speed: float) -> str:
 @attr.s
 class Track:
     filename: str = attr.ib()
-    points: List[trackpoint.TrackPoint] = attr.ib()
+    points: Union[List[trackpoint.TrackPoint], TrackColumns] = attr.ib()
     correct_crc: Optional[bool] = attr.ib(default=None)
     activity_timezone: Optional[datetime.timezone] = attr.ib(default=None)
 
@@ -69,37 +72,33 @@ class Track:
     def start_ts(self) -> datetime.datetime:
         return datetime.datetime.fromtimestamp(self.start_timestamp)
 
+    @cached_property
+    def columns(self) -> TrackColumns:
+        if isinstance(self.points, TrackColumns):
+            return self.points
+        return TrackColumns.from_points(self.points)
+
     @cached_property
     def ok_points(self) -> List[trackpoint.TrackPoint]:
+        if isinstance(self.points, TrackColumns):
+            return list(self.points[self.points.ok])
         return [point for point in self.points if point.is_ok]
 
     @cached_property
     def max_lat(self) -> float:
-        result = max(point.latitude for point in self.ok_points)
-        if result is None:
-            raise RuntimeError('No max_lat')
-        return result
+        return float(self.columns.latitude[self.columns.ok].max())
 
     @cached_property
     def max_long(self) -> float:
-        result = max(point.longitude for point in self.ok_points)
-        if result is None:
-            raise RuntimeError('No max_long')
-        return result
+        return float(self.columns.longitude[self.columns.ok].max())
 
     @cached_property
     def min_lat(self) -> float:
-        result = min(point.latitude for point in self.ok_points)
-        if result is None:
-            raise RuntimeError('No min_lat')
-        return result
+        return float(self.columns.latitude[self.columns.ok].min())
 
     @cached_property
     def min_long(self) -> float:
-        result = min(point.longitude for point in self.ok_points)
-        if result is None:
-            raise RuntimeError('No min_long')
-        return result
+        return float(self.columns.longitude[self.columns.ok].min())
 
     @cached_property
     def min_long_view(self) -> float:
@@ -173,7 +172,7 @@ class Track:
 
     @cached_property
     def ok_count(self) -> int:
-        return len(self.ok_points)
+        return int(self.columns.ok.sum())
 
     @cached_property
     def is_valid(self):
@@ -210,20 +209,30 @@ class Track:
         return segments
 
     @cached_property
-    def total_distance(self):
-        return sum(
-            segment.distance
-            for segment in self.segments
-            if segment.duration < SEGMENT_DURATION_THRESHOLD
-        )
+    def _ok_columns(self) -> TrackColumns:
+        return self.columns[self.columns.ok]
+
+    @cached_property
+    def _counted_segments(self) -> numpy.ndarray:
+        # mask of segments between ok points, long pauses are not counted
+        durations = numpy.diff(self._ok_columns.timestamp)
+        for duration in durations[durations >= SEGMENT_DURATION_THRESHOLD].tolist():
+            log.warning(f'Strange duration: {int(duration)}')
+        return durations < SEGMENT_DURATION_THRESHOLD
+
+    @cached_property
+    def total_distance(self) -> float:
+        return self.get_total_distance(geodesic.DEFAULT_MODE)
+
+    def get_total_distance(self, mode: geodesic.Mode) -> float:
+        # approximate modes are much faster on long tracks, see geodesic.Mode for their errors
+        distances = geodesic.segment_distances(self._ok_columns.latitude, self._ok_columns.longitude, mode=mode)
+        return float(distances[self._counted_segments].sum())
 
     @cached_property
     def total_duration(self) -> int:
-        return sum(
-            segment.duration
-            for segment in self.segments
-            if segment.duration < SEGMENT_DURATION_THRESHOLD
-        )
+        durations = numpy.diff(self._ok_columns.timestamp)
+        return int(durations[self._counted_segments].sum())
 
     @cached_property
     def average_speed(self):
@@ -0,0 +1,73 @@
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+import attr
+import numpy
+
+from tools.running.trackpoint import TrackPoint
+
+
+FIELDS = [field.name for field in attr.fields(TrackPoint)]
+INT_FIELDS = {'timestamp', 'cadence', 'heart_rate'}
+_IS_INT = [name in INT_FIELDS for name in FIELDS]
+
+
+def _to_point(row: List[float]) -> TrackPoint:
+    return TrackPoint(*(
+        None if value != value else int(value) if is_int else value
+        for value, is_int in zip(row, _IS_INT)
+    ))
+
+
+@dataclass(eq=False)
+class TrackColumns:
+    # Track points as float64 columns in TrackPoint fields order, None is stored as NaN.
+    # Works as a sequence of TrackPoint: objects are created only on access.
+    values: numpy.ndarray  # shape (len(FIELDS), points count)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[Optional[float], ...]]) -> 'TrackColumns':
+        values = numpy.array(list(rows), dtype=numpy.float64).reshape(-1, len(FIELDS))
+        return cls(values=numpy.ascontiguousarray(values.T))
+
+    @classmethod
+    def from_points(cls, points: Iterable[TrackPoint]) -> 'TrackColumns':
+        return cls.from_rows(tuple(getattr(point, name) for name in FIELDS) for point in points)
+
+    def column(self, name: str) -> numpy.ndarray:
+        return self.values[FIELDS.index(name)]
+
+    @property
+    def longitude(self) -> numpy.ndarray:
+        return self.column('longitude')
+
+    @property
+    def latitude(self) -> numpy.ndarray:
+        return self.column('latitude')
+
+    @property
+    def timestamp(self) -> numpy.ndarray:
+        return self.column('timestamp')
+
+    @cached_property
+    def ok(self) -> numpy.ndarray:
+        # same as TrackPoint.is_ok
+        return ~(numpy.isnan(self.latitude) | numpy.isnan(self.longitude))
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, TrackColumns):
+            return NotImplemented
+        return numpy.array_equal(self.values, other.values, equal_nan=True)
+
+    def __len__(self) -> int:
+        return self.values.shape[1]
+
+    def __getitem__(self, key: Union[int, slice, numpy.ndarray]) -> Union[TrackPoint, 'TrackColumns']:
+        if isinstance(key, (int, numpy.integer)):
+            return _to_point(self.values[:, key].tolist())
+        return TrackColumns(values=self.values[:, key])
+
+    def __iter__(self) -> Iterator[TrackPoint]:
+        for row in self.values.T.tolist():
+            yield _to_point(row)